@@ -1,5 +1,47 @@
 #!/usr/bin/python
+"""Build release/foundation_installer.mel from foundation_installer.py and
+foundation_mel_template.mel.
 
+The installer is embedded in the MEL file as its payload. By default the
+payload is zlib compressed and base64 encoded, split over string literals of
+CHUNK_SIZE characters, and decompressed by Python when the MEL file runs.
+With --mode plain it is embedded as one escaped MEL string instead.
+
+With --bundle a zip archive of a shared folder is embedded as well, the
+offline bundle. Installing from the MEL file then seeds the local store with
+it, for machines that can't reach the shared folder. The bundle is split over
+MEL procedures of BUNDLE_PART_SIZE string literals each, so Maya never has to
+hold more than one part of it as a single string.
+
+Payload and bundle are streamed into the MEL file a chunk at a time, so
+building takes about the same memory however large they are.
+
+The first line of the MEL file stamps the hash of everything it was built
+from. If it matches, building is skipped, unless --force is given. Files of
+the bundle are told apart by their size and modification time.
+
+With --matrix every variant listed in a JSON build matrix is built, on a pool
+of processes. The matrix is a dict of:
+
+output - path of each variant's MEL file relative to trunk, with %(name)s
+for the name of the variant
+mode - default mode of the variants
+variants - list of dicts of 'name', and optionally 'defaultPaths', the
+shared folders the installer suggests, 'mode', and 'bundle', the shared
+folder to embed an offline bundle of, relative to the matrix
+
+usage: createFoundationInstaller.py [options]
+"""
+
+import multiprocessing
+import optparse
+import tempfile
+import zipfile
+import hashlib
+import json
+import base64
+import zlib
+import sys
 import re
 import os
 
@@ -13,18 +55,296 @@ if __name__ == "__main__":
 else: L = logging.getLogger( __name__ )
 L.setLevel(logging.INFO)
 
-def createFoundationInstaller():
-	root = getOneDirUp( os.path.dirname(__file__) )
-	dst = os.path.join(root, "release", "foundation_installer.mel")
-	payload_path = os.path.join(root, "foundation_installer", "foundation_installer.py")
-	template_path = os.path.join(root, "foundation_installer", "foundation_mel_template.mel")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import publishFoundation
+
+MODES = ["zlib", "plain"]
+# Characters per string literal of encoded data, well below what MEL's parser
+# handles. Base64 turns every 3 bytes into 4 characters
+CHUNK_SIZE = 1024
+RAW_CHUNK_SIZE = CHUNK_SIZE // 4 * 3
+# String literals per procedure returning a part of the offline bundle
+BUNDLE_PART_SIZE = 1024
+# Bytes read from a file at a time
+READ_SIZE = 64 * 1024
+# Increase when the MEL written changes, to rebuild installers stamped by
+# earlier versions of this script
+BUILD_VERSION = 2
+STAMP = "// foundation_installer build %s\n"
+
+ESCAPES = {
+	'\\': '\\\\',
+	'"': '\\"',
+	'\n': '\\n',
+	'\t': '\\t',
+}
+ESCAPE_PATTERN = re.compile(r'[\\"\n\t]')
+# The lines of the template between these comments are replaced by the default
+# shared folder suggestions of a variant
+DEFAULT_PATHS_PATTERN = re.compile(
+	r"(/\* ==== DEFAULT SHARED FOLDER SUGGESTIONS.*?\*/)\n.*?\n(/\* ==== DO NOT EDIT FURTHER ==== \*/)",
+	re.DOTALL,
+)
+PAYLOAD_FILTER = "-%replacewithcontent%-"
+BUNDLE_FILTER = "-%bundle%-"
+
+def createFoundationInstaller(dst=None, mode="zlib", force=False, bundle=None):
+	"""Build the installer at dst, embedding an offline bundle of shared
+	folder bundle if given. Return dst, or None if it was up to date"""
+	root = getRoot()
+	if dst is None:
+		dst = os.path.join(root, "release", "foundation_installer.mel")
+	variant = {"name": "default", "mode": mode, "bundle": bundle}
+	payloadPath, template = getSources(root)
+	return buildVariant((payloadPath, template, variant, dst, force))
+
+def buildMatrix(matrixPath, names=None, jobs=None, force=False):
+	"""Build the variants of the build matrix at matrixPath, or only those
+	named in names. Return list of (variant name, MEL file, True if it was
+	built or False if it was up to date)"""
+	root = getRoot()
+	matrix = loadMatrix(matrixPath)
+	variants = matrix["variants"]
+	if names:
+		unknown = set(names) - set([v["name"] for v in variants])
+		if unknown:
+			raise ValueError("No variants named %s in '%s'" % (
+				", ".join(sorted(unknown)), matrixPath))
+		variants = [v for v in variants if v["name"] in names]
+
+	payloadPath, template = getSources(root)
+	tasks = []
+	for variant in variants:
+		variant = dict(variant)
+		variant.setdefault("mode", matrix.get("mode", "zlib"))
+		if variant.get("bundle"):
+			variant["bundle"] = os.path.join(
+				os.path.dirname(os.path.abspath(matrixPath)), variant["bundle"]
+			)
+		dst = os.path.normpath(os.path.join(root, matrix["output"] % {"name": variant["name"]}))
+		tasks.append((payloadPath, template, variant, dst, force))
+
+	# Only hashing is needed to tell a variant is up to date, so only those
+	# that do need building are handed to the pool
+	pending = [t for t in tasks if force or not isUpToDate(*t[:4])]
+	if len(pending) > 1 and jobs != 1:
+		pool = multiprocessing.Pool(jobs)
+		try:
+			built = pool.map(buildVariant, pending)
+		finally:
+			pool.close()
+			pool.join()
+	else:
+		built = map(buildVariant, pending)
+	built = set([b for b in built if b is not None])
+	return [(t[2]["name"], t[3], t[3] in built) for t in tasks]
+
+def loadMatrix(path):
+	"""Return build matrix at path, see the module documentation"""
+	matrix = json.loads(getFileContent(path))
+	if "output" not in matrix or not matrix.get("variants"):
+		raise ValueError("Build matrix '%s' needs 'output' and 'variants'" % path)
+	names = [v["name"] for v in matrix["variants"]]
+	if len(set(names)) != len(names):
+		raise ValueError("Build matrix '%s' names variants more than once" % path)
+	for variant in matrix["variants"]:
+		if variant.get("mode", matrix.get("mode", "zlib")) not in MODES:
+			raise ValueError("Variant '%s' has unknown mode, expected one of %s" % (
+				variant["name"], ", ".join(MODES)))
+	return matrix
+
+def buildVariant(task):
+	"""Build variant at dst unless it is up to date. Return dst, or None if
+	it was up to date. task is a tuple of (payloadPath, template, variant,
+	dst, force), so pools can map over tasks"""
+	payloadPath, template, variant, dst, force = task
+	template = getVariantTemplate(template, variant)
+	stamp = STAMP % getBuildHash(payloadPath, template, variant)
+	if not force and getStamp(dst) == stamp:
+		L.info( "'%s' is up to date" % dst )
+		return None
+
+	folder = os.path.dirname(dst)
+	if folder and not os.path.isdir(folder):
+		os.makedirs(folder)
+	# Written next to dst first, so an interrupted build never leaves a
+	# stamped but incomplete installer behind
+	tmp = "%s.%s.tmp" % (dst, os.getpid())
+	try:
+		out = open(tmp, "w")
+		try:
+			out.write(stamp)
+			writeInstaller(out, payloadPath, template, variant["mode"], variant.get("bundle"))
+		finally:
+			out.close()
+		publishFoundation.replaceFile(tmp, dst)
+	finally:
+		if os.path.exists(tmp):
+			os.remove(tmp)
+	L.info( "Wrote file '%s'" % dst )
+	return dst
+
+def isUpToDate(payloadPath, template, variant, dst):
+	template = getVariantTemplate(template, variant)
+	return getStamp(dst) == STAMP % getBuildHash(payloadPath, template, variant)
+
+def writeInstaller(out, payloadPath, template, mode="zlib", bundle=None):
+	"""Write MEL of template to file object out, with the payload at
+	payloadPath and an offline bundle of shared folder bundle, if given,
+	embedded"""
+	if mode not in MODES:
+		raise ValueError("mode must be one of %s" % ", ".join(MODES))
+	template = template.replace( "-%payloadencoding%-", mode )
+	head, rest = template.split(PAYLOAD_FILTER, 1)
+	middle, tail = rest.split(BUNDLE_FILTER, 1)
+
+	out.write(head)
+	f = open(payloadPath, "r")
+	try:
+		if mode == "zlib":
+			separator = ""
+			for line in getEncodedLines(iterCompressed(iterChunks(f))):
+				out.write('%s\t$content += "%s";' % (separator, line))
+				separator = "\n"
+		else:
+			out.write('\t$content = "')
+			for chunk in iterChunks(f):
+				out.write(escape(chunk))
+			out.write('";')
+	finally:
+		f.close()
+	out.write(middle)
+	writeBundle(out, bundle)
+	out.write(tail)
+
+def writeBundle(out, sharedFolder=None):
+	"""Write MEL procedures returning the parts of an offline bundle of
+	sharedFolder, and the number of parts, to file object out"""
+	parts = 0
+	if sharedFolder is not None:
+		fd, tmp = tempfile.mkstemp(prefix="foundationBundle", suffix=".zip")
+		os.close(fd)
+		try:
+			createBundle(sharedFolder, tmp)
+			f = open(tmp, "rb")
+			try:
+				lines = 0
+				for line in getEncodedLines(iterChunks(f)):
+					if lines == 0:
+						out.write('global proc string __foundation_getBundlePart%d__() {\n' % parts)
+						out.write('\tstring $content = "";\n')
+					out.write('\t$content += "%s";\n' % line)
+					lines += 1
+					if lines == BUNDLE_PART_SIZE:
+						out.write('\treturn $content;\n}\n\n')
+						parts += 1
+						lines = 0
+				if lines:
+					out.write('\treturn $content;\n}\n\n')
+					parts += 1
+			finally:
+				f.close()
+		finally:
+			os.remove(tmp)
+		L.info( "Embedded offline bundle of '%s' in %s parts" % (sharedFolder, parts) )
+	out.write('global proc int __foundation_getBundlePartCount__() {\n')
+	out.write('\treturn %d;\n}' % parts)
 
-	payload = getFileContent(payload_path)
-	template = getFileContent(template_path)
-	replaceFilter = "-%replacewithcontent%-";
+def createBundle(sharedFolder, dst):
+	"""Write a zip archive of the files in sharedFolder that Maya loads to dst"""
+	archive = zipfile.ZipFile(dst, "w", zipfile.ZIP_DEFLATED)
+	try:
+		for relPath in publishFoundation.getSharedFiles(sharedFolder):
+			archive.write(os.path.join(sharedFolder, relPath), relPath.replace(os.sep, "/"))
+	finally:
+		archive.close()
+
+def iterChunks(f, size=READ_SIZE):
+	"""Yield content of file object f a chunk at a time"""
+	while True:
+		chunk = f.read(size)
+		if not chunk:
+			return
+		yield chunk
+
+def iterCompressed(chunks):
+	"""Yield chunks zlib compressed as a single stream"""
+	compressor = zlib.compressobj(9)
+	for chunk in chunks:
+		data = compressor.compress(chunk)
+		if data:
+			yield data
+	yield compressor.flush()
 
-	content = template.replace( replaceFilter, escape(payload) )
-	setFileContent(dst, content)
+def getEncodedLines(chunks):
+	"""Yield base64 of chunks joined, CHUNK_SIZE characters at a time"""
+	pending = ""
+	for chunk in chunks:
+		pending += chunk
+		end = len(pending) - len(pending) % RAW_CHUNK_SIZE
+		for i in range(0, end, RAW_CHUNK_SIZE):
+			yield base64.b64encode(pending[i:i + RAW_CHUNK_SIZE])
+		pending = pending[end:]
+	if pending:
+		yield base64.b64encode(pending)
+
+def getVariantTemplate(template, variant):
+	"""Return template with the default shared folder suggestions of variant,
+	if it has any"""
+	paths = variant.get("defaultPaths")
+	if paths is None:
+		return template
+	lines = ["string $FOUNDATION_DEFAULT_PATHS[];"] + [
+		'$FOUNDATION_DEFAULT_PATHS[%d] = "%s";' % (i, escape(path))
+		for i, path in enumerate(paths)
+	]
+	match = DEFAULT_PATHS_PATTERN.search(template)
+	if match is None:
+		raise ValueError("Template has no default shared folder suggestions")
+	return "%s\n%s\n%s" % (
+		template[:match.end(1)], "\n".join(lines), template[match.start(2):]
+	)
+
+def getBuildHash(payloadPath, template, variant):
+	sha1 = hashlib.sha1()
+	for part in (str(BUILD_VERSION), variant["mode"], template):
+		sha1.update(hashlib.sha1(part).digest())
+	payload = hashlib.sha1()
+	f = open(payloadPath, "r")
+	try:
+		for chunk in iterChunks(f):
+			payload.update(chunk)
+	finally:
+		f.close()
+	sha1.update(payload.digest())
+	sharedFolder = variant.get("bundle")
+	if sharedFolder is not None:
+		for relPath in publishFoundation.getSharedFiles(sharedFolder):
+			st = os.stat(os.path.join(sharedFolder, relPath))
+			sha1.update("%s\0%d\0%d\0" % (
+				relPath.replace(os.sep, "/"), st.st_size, st.st_mtime
+			))
+	return sha1.hexdigest()
+
+def getSources(root):
+	"""Return path of the installer and content of the MEL template"""
+	return (
+		os.path.join(root, "foundation_installer", "foundation_installer.py"),
+		getFileContent(os.path.join(root, "foundation_installer", "foundation_mel_template.mel")),
+	)
+
+def getRoot():
+	return getOneDirUp( os.path.dirname(os.path.abspath(__file__)) )
+
+def getStamp(path):
+	"""Return first line of file at path, or None if there is no such file"""
+	if not os.path.exists(path):
+		return None
+	f = open(path, "r")
+	try:
+		return f.readline()
+	finally:
+		f.close()
 
 def getFileContent(path):
 	"""Return content of file"""
@@ -39,31 +359,53 @@ def getFileContent(path):
 	finally:
 		f.close()
 
-def setFileContent(path, content):
-	"""Create file with content"""
-	f = open(path, "w")
-	try:
-		f.write(content)
-	except:
-		raise
-	else:
-		L.info( "Wrote file '%s'" % path )
-	finally:
-		f.close()
-
 def escape(string):
 	"""Escape characters that needs escaping in order to become a valid MEL
 	string
 	"""
-	newstring = string
-	newstring = newstring.replace('\\', '\\\\')
-	newstring = newstring.replace('\"', '\\"')
-	newstring = newstring.replace('\n', '\\n')
-	newstring = newstring.replace('\t', '\\t')
-	return newstring
+	return ESCAPE_PATTERN.sub(lambda match: ESCAPES[match.group()], string)
 
 def getOneDirUp(path):
 	return os.path.dirname(path)
 
+def main():
+	parser = optparse.OptionParser(usage="%prog [options]")
+	parser.add_option("--output", metavar="FILE",
+		help="MEL file to write [default: release/foundation_installer.mel]")
+	parser.add_option("--mode", choices=MODES, default="zlib",
+		help="how to embed the payload, one of %s [default: %%default]" % ", ".join(MODES))
+	parser.add_option("--bundle", metavar="SHARED_FOLDER",
+		help="also embed an offline bundle of SHARED_FOLDER")
+	parser.add_option("--matrix", metavar="FILE",
+		help="build every variant of the JSON build matrix in FILE")
+	parser.add_option("--variant", action="append", default=[], metavar="NAME",
+		help="only build variant NAME of the matrix, can be repeated")
+	parser.add_option("--jobs", type="int",
+		help="variants to build at a time [default: one per CPU]")
+	parser.add_option("--force", action="store_true", default=False,
+		help="build even if the installer is up to date")
+	options, args = parser.parse_args()
+	if not options.matrix:
+		if options.variant:
+			parser.error("--variant requires --matrix")
+		bundle = options.bundle
+		if bundle is not None:
+			if not os.path.isdir(bundle):
+				parser.error("no such folder '%s'" % bundle)
+			bundle = os.path.abspath(bundle)
+		createFoundationInstaller(options.output, options.mode, options.force, bundle)
+		return
+
+	if options.output or options.bundle:
+		parser.error("--output and --bundle can't be used with --matrix, set them in the matrix")
+	try:
+		results = buildMatrix(options.matrix, options.variant, options.jobs, options.force)
+	except ValueError, e:
+		parser.error(str(e))
+	built = len([r for r in results if r[2]])
+	L.info( "Built %s of %s variants, %s were up to date" % (
+		built, len(results), len(results) - built
+	) )
+
 if __name__ == "__main__":
-	createFoundationInstaller()
\ No newline at end of file
+	main()
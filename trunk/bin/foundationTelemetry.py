@@ -0,0 +1,150 @@
+#!/usr/bin/python
+"""Report Maya startup times collected by foundationBoot.py.
+
+Each Maya session appends a record of its startup to telemetry.jsonl in the
+foundationCache folder next to foundationBoot.py. Collect these files from the
+studio's machines, for example into one folder, and pass them or the folder
+to this script to see p50/p95/p99 startup times broken down by host, Maya
+version and boot mode. Records found in more than one file are counted once.
+
+usage: foundationTelemetry.py [options] FILE_OR_FOLDER...
+"""
+
+import optparse
+import fnmatch
+import math
+import json
+import time
+import sys
+import os
+
+# Instantiate logger class
+import logging
+if __name__ == "__main__":
+	L = logging.getLogger( os.path.basename(__file__) )
+	ch = logging.StreamHandler()
+	ch.setFormatter( logging.Formatter("%(name)s : %(levelname)s : %(message)s") )
+	L.addHandler(ch)
+else: L = logging.getLogger( __name__ )
+L.setLevel(logging.INFO)
+
+# Record fields reported on, with their column titles
+GROUPS = [("host", "Host"), ("maya", "Maya"), ("mode", "Boot mode")]
+PERCENTILES = [50, 95, 99]
+
+def readRecords(paths):
+	"""Return list of records in the telemetry files at paths, which may also
+	be folders searched for telemetry*.jsonl files. Lines that aren't startup
+	records are skipped"""
+	records = []
+	seen = set()
+	for path in getTelemetryFiles(paths):
+		f = open(path, "r")
+		try:
+			for lineno, line in enumerate(f):
+				line = line.strip()
+				if not line:
+					continue
+				try:
+					record = json.loads(line)
+				except ValueError:
+					L.warning( "Skipped bad record at '%s' line %s" % (path, lineno + 1) )
+					continue
+				if not isinstance(record, dict) or "total" not in record:
+					continue
+				key = (record.get("host"), record.get("time"), record.get("total"))
+				if key in seen:
+					continue
+				seen.add(key)
+				records.append(record)
+		finally:
+			f.close()
+	return records
+
+def getTelemetryFiles(paths):
+	"""Yield paths of telemetry files in paths"""
+	for path in paths:
+		if not os.path.isdir(path):
+			yield path
+			continue
+		for dirpath, dirnames, filenames in os.walk(path):
+			dirnames.sort()
+			for filename in sorted(filenames):
+				# Leaves out install.jsonl, the installer's journal
+				if fnmatch.fnmatch(filename, "telemetry*.jsonl"):
+					yield os.path.join(dirpath, filename)
+
+def getValue(record, phase=None):
+	"""Return startup time of record, or time of its phase"""
+	if phase is None:
+		return record.get("total")
+	return record.get("phases", {}).get(phase)
+
+def percentile(values, p):
+	"""Return the p-th percentile of sorted values, by nearest rank"""
+	rank = int(math.ceil(p * len(values) / 100.0)) - 1
+	return values[min(max(rank, 0), len(values) - 1)]
+
+def summarize(records, field, phase=None):
+	"""Return list of (group, count, percentiles) of records grouped by field,
+	slowest p50 first"""
+	groups = {}
+	for record in records:
+		value = getValue(record, phase)
+		if value is None:
+			continue
+		groups.setdefault(record.get(field), []).append(value)
+	rows = []
+	for group, values in groups.items():
+		values.sort()
+		rows.append((group, len(values), [percentile(values, p) for p in PERCENTILES]))
+	rows.sort(key=lambda row: row[2][0], reverse=True)
+	return rows
+
+def formatReport(records, phase=None):
+	"""Return text table of startup times of records per group"""
+	if phase is None:
+		subject = "Startup time"
+	else:
+		subject = "Time of phase '%s'" % phase
+	lines = ["%s in seconds over %s sessions" % (subject, len(records))]
+	header = ["count"] + ["p%d" % p for p in PERCENTILES]
+	for field, title in [(None, "All")] + GROUPS:
+		if field is None:
+			rows = summarize([dict(r, all="all") for r in records], "all", phase)
+		else:
+			rows = summarize(records, field, phase)
+		lines.append("")
+		lines.append("%-24s" % title + "".join(["%10s" % h for h in header]))
+		for group, count, values in rows:
+			lines.append(
+				"%-24s" % group + "%10d" % count + "".join(["%10.3f" % v for v in values])
+			)
+	return "\n".join(lines)
+
+def main():
+	parser = optparse.OptionParser(usage="%prog [options] FILE_OR_FOLDER...")
+	parser.add_option("--phase",
+		help="report one startup phase instead of the whole startup, one of "
+		"probe, resolve, hooks, modules or save")
+	parser.add_option("--days", type="float",
+		help="only count sessions of the last DAYS days")
+	parser.add_option("--host", action="append", default=[],
+		help="only count sessions on this host, can be repeated")
+	options, args = parser.parse_args()
+	if not args:
+		parser.error("expected at least one FILE_OR_FOLDER")
+
+	records = readRecords(args)
+	if options.days is not None:
+		since = time.time() - options.days * 24 * 60 * 60
+		records = [r for r in records if r.get("time", 0) >= since]
+	if options.host:
+		records = [r for r in records if r.get("host") in options.host]
+	if not records:
+		L.error( "No startup records found" )
+		sys.exit(1)
+	print formatReport(records, options.phase)
+
+if __name__ == "__main__":
+	main()
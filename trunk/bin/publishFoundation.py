@@ -0,0 +1,318 @@
+#!/usr/bin/python
+"""Publish a Shared Scripting folder for fast loading.
+
+Packs the folder into one versioned zip archive holding sources and
+precompiled bytecode, which foundationBoot.py puts on sys.path when its
+FOUNDATION_BOOT_MODE is 'zip'. Archives are written to the folder's
+.foundation/bundles directory and .foundation/bundle names the current one.
+
+Note that scripts loaded from an archive can not open data files relative to
+their __file__.
+
+A manifest of every module in the folder is written to
+.foundation/manifest.json, letting foundationBoot.py import shared modules
+without searching the folder. It also lists the size, mtime and SHA-1 of every
+file, so local mirrors only fetch content they don't already hold.
+
+With --precompile every .py file is also compiled by each given interpreter, in
+parallel, into .foundation/bytecode. foundationBoot.py's bytecode cache picks
+these up instead of compiling shared modules itself.
+
+usage: publishFoundation.py [options] SHARED_FOLDER
+"""
+
+import optparse
+import subprocess
+import tempfile
+import datetime
+import zipfile
+import py_compile
+import hashlib
+import json
+import sys
+import os
+
+# Instantiate logger class
+import logging
+if __name__ == "__main__":
+	L = logging.getLogger( os.path.basename(__file__) )
+	ch = logging.StreamHandler()
+	ch.setFormatter( logging.Formatter("%(name)s : %(levelname)s : %(message)s") )
+	L.addHandler(ch)
+else: L = logging.getLogger( __name__ )
+L.setLevel(logging.INFO)
+
+# These names are also hardcoded in the generated foundationBoot.py
+META_DIR = ".foundation"
+BUNDLE_DIR = "bundles"
+BUNDLE_POINTER = "bundle"
+BYTECODE_DIR = "bytecode"
+MANIFEST = "manifest.json"
+
+# Run by each target interpreter with the shared folder and output folder as
+# arguments and paths of the files to compile on stdin. The output layout and
+# interpreter tag must match BytecodeCache in the generated foundationBoot.py
+PRECOMPILE_SCRIPT = r'''
+import sys, os, binascii, hashlib, marshal
+try:
+	from importlib.util import MAGIC_NUMBER
+except ImportError:
+	import imp
+	MAGIC_NUMBER = imp.get_magic()
+
+root, outRoot = sys.argv[1:3]
+tag = "py%d%d-%s" % (
+	sys.version_info[0],
+	sys.version_info[1],
+	binascii.hexlify(MAGIC_NUMBER).decode("ascii"),
+)
+out = os.path.join(outRoot, tag)
+if not os.path.isdir(out):
+	try:
+		os.makedirs(out)
+	except OSError:
+		pass
+
+for relPath in sys.stdin.read().splitlines():
+	path = os.path.join(root, relPath)
+	f = open(path, "rb")
+	try:
+		source = f.read()
+	finally:
+		f.close()
+	dst = os.path.join(out, hashlib.sha1(source).hexdigest() + ".code")
+	if os.path.exists(dst):
+		continue
+	source = source.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+	if not source.endswith(b"\n"):
+		source += b"\n"
+	try:
+		code = compile(source, path, "exec", 0, True)
+	except SyntaxError:
+		sys.stderr.write("Skipped %s: %s\n" % (path, sys.exc_info()[1]))
+		continue
+	tmp = "%s.%d.tmp" % (dst, os.getpid())
+	f = open(tmp, "wb")
+	try:
+		f.write(marshal.dumps(code))
+	finally:
+		f.close()
+	if os.path.exists(dst):
+		os.remove(tmp)
+	else:
+		os.rename(tmp, dst)
+'''
+
+def publishFoundation(sharedFolder, version=None, keep=None):
+	"""Create a new bundle of sharedFolder and make it the current one. Return
+	path of the bundle"""
+	if version is None:
+		version = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+	metaDir = os.path.join(sharedFolder, META_DIR)
+	bundleDir = os.path.join(metaDir, BUNDLE_DIR)
+	if not os.path.isdir(bundleDir):
+		os.makedirs(bundleDir)
+
+	name = "foundation-%s.zip" % version
+	dst = os.path.join(bundleDir, name)
+	createBundle(sharedFolder, dst)
+	replaceFileContent(os.path.join(metaDir, BUNDLE_POINTER), name)
+	L.info( "Published bundle '%s'" % dst )
+
+	if keep is not None:
+		pruneBundles(bundleDir, keep, name)
+	return dst
+
+def createBundle(sharedFolder, dst):
+	"""Write a zip archive of sharedFolder to dst, with each .py file followed
+	by its bytecode compiled for the running interpreter"""
+	fd, tmp = tempfile.mkstemp(suffix=".zip", dir=os.path.dirname(dst))
+	os.close(fd)
+	pyc = tmp + ".pyc"
+	try:
+		archive = zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED)
+		try:
+			for relPath in getSharedFiles(sharedFolder):
+				path = os.path.join(sharedFolder, relPath)
+				arcname = relPath.replace(os.sep, "/")
+				archive.write(path, arcname)
+				if relPath.endswith(".py"):
+					# zipimport only uses the bytecode when its embedded mtime
+					# matches the source entry, which py_compile takes care of
+					py_compile.compile(path, cfile=pyc, dfile=path, doraise=True)
+					archive.write(pyc, arcname[:-3] + ".pyc")
+		finally:
+			archive.close()
+		replaceFile(tmp, dst)
+	finally:
+		for path in (tmp, pyc):
+			if os.path.exists(path):
+				os.remove(path)
+	L.info( "Wrote file '%s'" % dst )
+
+def writeManifest(sharedFolder):
+	"""Write manifest mapping module names in sharedFolder to their file and
+	whether they are a package. Its stamp is the modification time of
+	sharedFolder, which tells foundationBoot.py when the manifest is stale"""
+	metaDir = os.path.join(sharedFolder, META_DIR)
+	if not os.path.isdir(metaDir):
+		os.makedirs(metaDir)
+	manifest = {
+		"stamp": os.stat(sharedFolder).st_mtime,
+		"modules": getModules(sharedFolder),
+		"files": getFileHashes(sharedFolder),
+	}
+	path = os.path.join(metaDir, MANIFEST)
+	replaceFileContent(path, json.dumps(manifest, sort_keys=True))
+	L.info( "Wrote manifest of %s modules to '%s'" % (len(manifest["modules"]), path) )
+	return path
+
+def getModules(sharedFolder):
+	"""Return dict of importable module name: [relative path, isPackage]"""
+	modules = {}
+	for dirpath, dirnames, filenames in os.walk(sharedFolder):
+		# Only packages are searched for submodules
+		dirnames[:] = sorted([d for d in dirnames if not d.startswith(".")
+			and os.path.isfile(os.path.join(dirpath, d, "__init__.py"))])
+		relDir = os.path.relpath(dirpath, sharedFolder)
+		if relDir == ".":
+			prefix = ""
+		else:
+			prefix = relDir.replace(os.sep, ".") + "."
+		for filename in filenames:
+			if filename.startswith(".") or not filename.endswith(".py"):
+				continue
+			relPath = os.path.normpath(os.path.join(relDir, filename))
+			relPath = relPath.replace(os.sep, "/")
+			name = filename[:-3]
+			if name == "__init__":
+				if prefix:
+					modules[prefix[:-1]] = [relPath, True]
+			else:
+				modules[prefix + name] = [relPath, False]
+	return modules
+
+def getFileHashes(sharedFolder):
+	"""Return dict of relative path, using forward slashes: [size, mtime, sha1]
+	of every file in sharedFolder"""
+	hashes = {}
+	for relPath in getSharedFiles(sharedFolder):
+		path = os.path.join(sharedFolder, relPath)
+		st = os.stat(path)
+		sha = hashlib.sha1()
+		f = open(path, "rb")
+		try:
+			while True:
+				chunk = f.read(1024 * 1024)
+				if not chunk:
+					break
+				sha.update(chunk)
+		finally:
+			f.close()
+		hashes[relPath.replace(os.sep, "/")] = [st.st_size, st.st_mtime, sha.hexdigest()]
+	return hashes
+
+def precompile(sharedFolder, interpreters, jobs=1):
+	"""Compile every .py file in sharedFolder with each of interpreters, using
+	'jobs' processes per interpreter. Return list of interpreters that failed"""
+	files = [p for p in getSharedFiles(sharedFolder) if p.endswith(".py")]
+	outRoot = os.path.join(sharedFolder, META_DIR, BYTECODE_DIR)
+
+	processes = []
+	for interpreter in interpreters:
+		for i in range(jobs):
+			chunk = files[i::jobs]
+			if not chunk:
+				continue
+			try:
+				process = subprocess.Popen(
+					[interpreter, "-c", PRECOMPILE_SCRIPT, sharedFolder, outRoot],
+					stdin=subprocess.PIPE,
+				)
+			except OSError, e:
+				L.error( "Could not run '%s': %s" % (interpreter, e) )
+				processes.append((interpreter, None))
+				continue
+			process.stdin.write("\n".join(chunk))
+			process.stdin.close()
+			processes.append((interpreter, process))
+
+	failed = []
+	for interpreter, process in processes:
+		if process is None or process.wait() != 0:
+			if interpreter not in failed:
+				failed.append(interpreter)
+	for interpreter in interpreters:
+		if interpreter in failed:
+			L.error( "Precompiling with '%s' failed" % interpreter )
+		else:
+			L.info( "Precompiled %s files with '%s'" % (len(files), interpreter) )
+	return failed
+
+def getSharedFiles(sharedFolder):
+	"""Yield paths, relative to sharedFolder, of every file that gets loaded
+	by Maya. Hidden files and folders and compiled Python files are skipped"""
+	for dirpath, dirnames, filenames in os.walk(sharedFolder):
+		dirnames[:] = sorted([d for d in dirnames if not d.startswith(".")])
+		relDir = os.path.relpath(dirpath, sharedFolder)
+		for filename in sorted(filenames):
+			if filename.startswith(".") or filename.endswith((".pyc", ".pyo")):
+				continue
+			yield os.path.normpath(os.path.join(relDir, filename))
+
+def pruneBundles(bundleDir, keep, current):
+	"""Remove all but the newest 'keep' bundles. Bundles still opened by a
+	running Maya can not be removed on Windows and are left for next time"""
+	names = [n for n in os.listdir(bundleDir) if n.endswith(".zip") and n != current]
+	names.sort(key=lambda n: os.path.getmtime(os.path.join(bundleDir, n)))
+	for name in names[:max(len(names) - (keep - 1), 0)]:
+		try:
+			os.remove(os.path.join(bundleDir, name))
+		except OSError, e:
+			L.warning( "Could not remove old bundle '%s': %s" % (name, e) )
+		else:
+			L.info( "Removed old bundle '%s'" % name )
+
+def replaceFileContent(path, content):
+	"""Atomically replace content of file at path"""
+	tmp = path + ".tmp"
+	f = open(tmp, "w")
+	try:
+		f.write(content)
+	finally:
+		f.close()
+	replaceFile(tmp, path)
+
+def replaceFile(src, dst):
+	"""Rename src to dst, replacing dst if it exists"""
+	try:
+		os.rename(src, dst)
+	except OSError:
+		# Windows refuses to rename onto an existing file
+		os.remove(dst)
+		os.rename(src, dst)
+
+def main():
+	parser = optparse.OptionParser(usage="%prog [options] SHARED_FOLDER")
+	parser.add_option("--version", help="bundle version, defaults to a timestamp")
+	parser.add_option("--keep", type="int",
+		help="number of bundles to keep, including the new one")
+	parser.add_option("--no-bundle", dest="bundle", action="store_false",
+		default=True, help="do not create a bundle")
+	parser.add_option("--precompile", action="append", default=[],
+		metavar="PYTHON", help="precompile with this interpreter, can be repeated")
+	parser.add_option("--jobs", type="int", default=4,
+		help="processes per precompiling interpreter [default: %default]")
+	options, args = parser.parse_args()
+	if len(args) != 1:
+		parser.error("expected exactly one SHARED_FOLDER")
+
+	writeManifest(args[0])
+	if options.precompile:
+		if precompile(args[0], options.precompile, options.jobs):
+			sys.exit(1)
+	if options.bundle:
+		publishFoundation(args[0], version=options.version, keep=options.keep)
+
+if __name__ == "__main__":
+	main()
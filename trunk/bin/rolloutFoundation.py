@@ -0,0 +1,247 @@
+#!/usr/bin/python
+"""Install maya foundation for many users at once.
+
+Takes Maya user script directories, or with --homes the users' home
+directories, and installs to each of them with install() from
+foundation_installer.py. Installs run in parallel, each in a process of its
+own that is stopped once it takes longer than --timeout. Installing is
+idempotent, so a rollout can simply be run again for the targets that failed.
+
+sharedUserSetup.py is written to the shared folder once up front, if it is
+missing, instead of by every install.
+
+usage: rolloutFoundation.py [options] SHARED_FOLDER [TARGET...]
+"""
+
+import multiprocessing
+import traceback
+import signal
+import optparse
+import json
+import time
+import sys
+import os
+
+# Instantiate logger class
+import logging
+if __name__ == "__main__":
+	L = logging.getLogger( os.path.basename(__file__) )
+	ch = logging.StreamHandler()
+	ch.setFormatter( logging.Formatter("%(name)s : %(levelname)s : %(message)s") )
+	L.addHandler(ch)
+else: L = logging.getLogger( __name__ )
+L.setLevel(logging.INFO)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+	os.path.abspath(__file__))), "foundation_installer"))
+import foundation_installer
+
+# Maya's user folders below a home directory, by platform. Each is a tuple of
+# the user script directory and prefs directory, with %s for the Maya version
+HOME_LAYOUTS = {
+	"windows": ("Documents/maya/%s/prefs/scripts", "Documents/maya/%s/prefs"),
+	"mac": ("Library/Preferences/Autodesk/maya/%s/scripts",
+		"Library/Preferences/Autodesk/maya/%s/prefs"),
+	"linux": ("maya/%s/scripts", "maya/%s/prefs"),
+}
+ACTIONS = ["created", "appended", "overwrote", "skipped"]
+# Seconds an install process gets to exit once it is done or stopped
+EXIT_TIMEOUT = 5
+
+def rollout(sharedFolder, targets, jobs=8, timeout=60, settings=None, dryRun=False):
+	"""Install to targets, a list of (userScriptDir, userPrefDir), running up
+	to 'jobs' installs at a time. Return dict of userScriptDir: result of
+	install(), or for installs that couldn't finish a dict of 'success' False
+	and 'error'"""
+	results = {}
+	pending = list(targets)
+	running = {}
+	while pending or running:
+		while pending and len(running) < jobs:
+			target = pending.pop(0)
+			receiver, sender = multiprocessing.Pipe(duplex=False)
+			process = multiprocessing.Process(
+				target=installTarget,
+				args=(sender, sharedFolder, target[0], target[1], settings, dryRun),
+			)
+			process.daemon = True
+			process.start()
+			sender.close()
+			running[target[0]] = (process, receiver, time.time())
+
+		time.sleep(0.01)
+		now = time.time()
+		for userScriptDir, (process, receiver, start) in running.items():
+			result = None
+			if receiver.poll():
+				try:
+					result = receiver.recv()
+				except EOFError:
+					result = getFailure("install exited with status %s" % process.exitcode)
+			elif now - start > timeout:
+				process.terminate()
+				result = getFailure("install took longer than %ss" % timeout)
+			elif not process.is_alive():
+				result = getFailure("install exited with status %s" % process.exitcode)
+			if result is None:
+				continue
+			process.join(EXIT_TIMEOUT)
+			if process.is_alive():
+				abandonProcess(process)
+			receiver.close()
+			del running[userScriptDir]
+			results[userScriptDir] = result
+			if result["success"]:
+				L.debug( "Installed to '%s'" % userScriptDir )
+			else:
+				L.warning( "Install to '%s' failed" % userScriptDir )
+	return results
+
+def installTarget(sender, sharedFolder, userScriptDir, userPrefDir, settings, dryRun):
+	"""Run in a process of its own by rollout"""
+	try:
+		result = foundation_installer.install(
+			sharedFolder, userScriptDir, userPrefDir, settings, dryRun
+		)
+	except Exception:
+		result = getFailure(traceback.format_exc())
+	sender.send(result)
+	sender.close()
+
+def abandonProcess(process):
+	"""Kill process, which didn't exit when asked to, e.g. as it is stuck in
+	I/O on a hung file server, and stop waiting for it"""
+	L.warning( "Install process %s did not exit, killing it" % process.pid )
+	if hasattr(signal, "SIGKILL"):
+		try:
+			os.kill(process.pid, signal.SIGKILL)
+		except OSError:
+			pass
+	# Keep multiprocessing from joining it when the rollout exits
+	multiprocessing.current_process()._children.discard(process)
+
+def getFailure(error):
+	return {"success": False, "files": [], "error": error}
+
+def getTargets(paths, homes=False, mayaVersion=None, layout=None):
+	"""Return list of (userScriptDir, userPrefDir) for paths. userPrefDir is
+	None when it is left for install() to find. Paths naming the same
+	directory give one target, as installs to it must not run at once"""
+	targets = []
+	seen = set()
+	for path in paths:
+		path = os.path.abspath(path)
+		if homes:
+			scripts, prefs = HOME_LAYOUTS[layout]
+			target = (
+				os.path.join(path, os.path.normpath(scripts % mayaVersion), ""),
+				os.path.join(path, os.path.normpath(prefs % mayaVersion), ""),
+			)
+		else:
+			target = (os.path.join(path, ""), None)
+		key = os.path.normcase(os.path.abspath(target[0]))
+		if key in seen:
+			continue
+		seen.add(key)
+		targets.append(target)
+	return targets
+
+def readTargets(path):
+	"""Return paths listed one per line in file at path, skipping blank lines
+	and # comments"""
+	f = open(path, "r")
+	try:
+		lines = [l.strip() for l in f]
+	finally:
+		f.close()
+	return [l for l in lines if l and not l.startswith("#")]
+
+def getReport(results, seconds):
+	"""Return text summary of results of rollout"""
+	counts = dict([(action, 0) for action in ACTIONS])
+	failed = []
+	for userScriptDir, result in sorted(results.items()):
+		for f in result["files"]:
+			# Files a failed install didn't get to weren't skipped
+			if result["success"] or f["action"] != "skipped":
+				counts[f["action"]] += 1
+		if not result["success"]:
+			error = (result.get("error") or "unknown error").strip().splitlines()
+			failed.append("  %s: %s" % (userScriptDir, error[-1]))
+	lines = [
+		"Installed to %s of %s targets in %.1fs" % (
+			len(results) - len(failed), len(results), seconds
+		),
+		"Files: " + ", ".join(["%s %s" % (counts[a], a) for a in ACTIONS]),
+	]
+	if results and results.values()[0].get("dryRun"):
+		lines[0] = "Dry run, nothing was written. " + lines[0]
+	if failed:
+		lines.append("Failed %s targets:" % len(failed))
+		lines.extend(failed)
+	return "\n".join(lines)
+
+def getDefaultLayout():
+	if sys.platform.startswith("win"):
+		return "windows"
+	if sys.platform == "darwin":
+		return "mac"
+	return "linux"
+
+def main():
+	parser = optparse.OptionParser(usage="%prog [options] SHARED_FOLDER [TARGET...]")
+	parser.add_option("--targets-file", metavar="FILE",
+		help="file listing targets one per line, in addition to those given")
+	parser.add_option("--homes", action="store_true",
+		help="targets are home directories instead of user script directories")
+	parser.add_option("--maya-version", metavar="VERSION",
+		help="Maya version folder to install to in home directories, e.g. 2012-x64")
+	parser.add_option("--layout", choices=sorted(HOME_LAYOUTS), default=getDefaultLayout(),
+		help="platform layout of home directories [default: %default]")
+	parser.add_option("--jobs", type="int", default=8,
+		help="installs to run at a time [default: %default]")
+	parser.add_option("--timeout", type="float", default=60,
+		help="seconds an install may take [default: %default]")
+	parser.add_option("--set", action="append", default=[], metavar="NAME=VALUE",
+		help="boot setting to write into foundationBoot.py, can be repeated")
+	parser.add_option("--dry-run", action="store_true", default=False,
+		help="report what installing would do without writing anything")
+	parser.add_option("--json", metavar="FILE",
+		help="also write the result of every install to FILE as JSON")
+	options, args = parser.parse_args()
+	if not args:
+		parser.error("expected SHARED_FOLDER")
+	paths = args[1:]
+	if options.targets_file:
+		paths.extend(readTargets(options.targets_file))
+	if not paths:
+		parser.error("expected at least one TARGET")
+	if options.homes and not options.maya_version:
+		parser.error("--homes requires --maya-version")
+	try:
+		settings = dict([foundation_installer.parseSetting(s) for s in options.set])
+	except ValueError, e:
+		parser.error(str(e))
+
+	start = time.time()
+	sharedFolder = os.path.abspath(args[0])
+	if not options.dry_run:
+		written = foundation_installer.writeSharedUserSetup(sharedFolder)
+		if written is not None:
+			L.info( "Wrote '%s'" % written )
+	targets = getTargets(paths, options.homes, options.maya_version, options.layout)
+	results = rollout(sharedFolder, targets, options.jobs, options.timeout, settings,
+		options.dry_run)
+	print getReport(results, time.time() - start)
+
+	if options.json:
+		f = open(options.json, "w")
+		try:
+			json.dump(results, f, indent=1, sort_keys=True, separators=(",", ": "))
+		finally:
+			f.close()
+	if len([r for r in results.values() if not r["success"]]):
+		sys.exit(1)
+
+if __name__ == "__main__":
+	main()
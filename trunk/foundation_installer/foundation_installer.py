@@ -2,21 +2,36 @@
 #
 # foundation_installer.py
 # mayaPyTools
-"""NOTE: Upon module load the Foundation installer is automatically initialized!
+"""Installs maya foundation for the current user.
 
-This is done to ease the initialization of the installer because it shifts the
-code completely into Python domain instead of relying on fickle MEL to get
-started"""
+foundation_installer.mel runs this module from memory, as module
+foundation_installer, and calls main(), which opens the installer window.
+install() runs an installation without any UI, and running this file
+installs from the command line, under mayapy or plain Python:
 
-from collections import defaultdict
-import webbrowser
+	python foundation_installer.py --user-script-dir DIR SHARED_FOLDER
+
+This prints the result of install() as JSON"""
+
+from collections import deque
+import threading
+import weakref
 import datetime
 import os.path
+import hashlib
+import json
+import shutil
+import tempfile
+import time
 import sys
 import re
-import maya.cmds as mc
-import maya.mel
 import traceback
+try:
+	import maya.cmds as mc
+	import maya.mel
+except ImportError:
+	# Outside of Maya only install() is available
+	mc = None
 
 
 # Instantiate logger class
@@ -29,6 +44,56 @@ L.setLevel(logging.ERROR)
 #	L.addHandler(ch)
 
 
+# Default settings written into foundationBoot.py. At boot time each of them can
+# be overridden by an environment variable of the same name
+BOOT_SETTINGS = {
+	# 'direct' loads scripts straight from the Shared Scripting folder, 'mirror'
+	# copies changed files to a local cache first and loads scripts from there,
+	# 'zip' loads scripts from the bundle made by publishFoundation.py
+	"FOUNDATION_BOOT_MODE": "direct",
+	# Keep compiled shared modules in a local cache when loading straight from
+	# the Shared Scripting folder, which artists usually can not write to
+	"FOUNDATION_BYTECODE_CACHE": True,
+	# Resolve shared modules from the manifest written by publishFoundation.py
+	# instead of searching the Shared Scripting folder
+	"FOUNDATION_MANIFEST": True,
+	# Remember names of modules missing from the Shared Scripting folder, so
+	# later imports of them don't search it again until the folder changes.
+	# Works through the import hook of FOUNDATION_BYTECODE_CACHE, so it is off
+	# whenever that is off
+	"FOUNDATION_NEGATIVE_CACHE": True,
+	# Time every import made by sharedUserSetup.py, write the results to
+	# foundationBootProfile.json in the user prefs directory and print the
+	# slowest imports once Maya is done initializing
+	"FOUNDATION_PROFILE": False,
+	"FOUNDATION_PROFILE_TOP": 10,
+	# Read ('read'), or read and compile ('compile'), the shared modules loaded
+	# during the last startup on background threads while Maya boots. Any
+	# other value turns this off
+	"FOUNDATION_PREFETCH": "read",
+	"FOUNDATION_PREFETCH_THREADS": 8,
+	# Record which shared module imports which in foundationCache/importGraph.json,
+	# and compile the modules most sessions import, with all they import in
+	# turn, into the bytecode cache on the prefetch threads while Maya loads.
+	# Needs FOUNDATION_BYTECODE_CACHE
+	"FOUNDATION_WARMUP": True,
+	# Seconds to wait for the Shared Scripting folder to respond. Past that Maya
+	# starts from the last complete local mirror, or without shared scripts.
+	# 0 waits for as long as the file server takes
+	"FOUNDATION_BOOT_TIMEOUT": 5.0,
+	# Folder of the local store holding mirrored files, shared by all Maya
+	# versions. Empty puts it next to the version folders in Maya's app dir
+	"FOUNDATION_STORE_DIR": "",
+	# Megabytes the store may take before least recently used mirrors go
+	"FOUNDATION_STORE_SIZE": 2048,
+	# Append timings of each startup to foundationCache/telemetry.jsonl, for
+	# foundationTelemetry.py to report on. Past FOUNDATION_TELEMETRY_SIZE
+	# kilobytes the file is moved to telemetry.1.jsonl and a new one started
+	"FOUNDATION_TELEMETRY": True,
+	"FOUNDATION_TELEMETRY_SIZE": 512,
+}
+
+
 # Custom exceptions
 class FoundationException(Exception):
 	def __init__(self, value): self.value = value
@@ -39,36 +104,212 @@ class UnknownPlatformException(FoundationException):
 	def __str__(self): return repr(self.value)
 
 
-class Observable(defaultdict):
-	"""Observer class designed for lightweight messaging."""
-	def __init__ (self):
-		defaultdict.__init__(self, object)
-
-	def emit (self, *args):
-		'''Pass parameters to all observers and update states.'''
+# Works out the facts about the running Maya that can't change during a
+# session. Defined from source so foundationBoot.py gets the very same code,
+# see Model._getBootEnvironmentContent
+ENVIRONMENT_PROBE = r'''
+class Environment(object):
+	"""Facts about the running Maya that can't change during a session:
+
+	platform - 'windows', 'mac' or 'linux', or None if unknown
+	mayaVersion - as given by 'about -version'
+	pythonVersion - e.g. '2.6.4'
+	userScriptDir, userPrefDir - Maya's user folders, ending in a slash
+
+	Outside of Maya only platform and pythonVersion are known, the others are
+	None. Use probe() to get the Environment of the running process"""
+	current = None
+
+	def __init__(self, platform=None, mayaVersion=None, pythonVersion=None,
+			userScriptDir=None, userPrefDir=None):
+		self.platform = platform
+		self.mayaVersion = mayaVersion
+		self.pythonVersion = pythonVersion
+		self.userScriptDir = userScriptDir
+		self.userPrefDir = userPrefDir
+
+	@classmethod
+	def probe(cls, **known):
+		"""Return the Environment of this process. Maya is only asked the
+		first time, and only for facts not given as keyword arguments"""
+		if cls.current is None:
+			cls.current = cls(**cls.getFacts(known))
+		return cls.current
+
+	@classmethod
+	def getFacts(cls, known):
+		facts = {"pythonVersion": "%d.%d.%d" % sys.version_info[:3]}
+		facts.update(known)
+		try:
+			import maya.cmds as cmds
+			cmds.about
+		except (ImportError, AttributeError):
+			# Not in Maya, or Maya isn't initialized
+			facts.setdefault("platform", cls.getPlatform(sys.platform))
+			return facts
+
+		def ask(name, query):
+			if name not in facts:
+				try:
+					facts[name] = query()
+				except Exception:
+					facts[name] = None
+		ask("platform", lambda: cls.getPlatform(cmds.about(operatingSystem=True)))
+		ask("mayaVersion", lambda: cmds.about(version=True))
+		ask("userPrefDir", lambda: cmds.internalVar(userPrefDir=True))
+		if facts["platform"] == "windows":
+			# The folder Maya looks for userSetup.py in before its own
+			# user script directory
+			ask("userScriptDir", lambda: facts["userPrefDir"] + "scripts/")
+		else:
+			ask("userScriptDir", lambda: cmds.internalVar(userScriptDir=True))
+		return facts
+
+	@staticmethod
+	def getPlatform(name):
+		"""Return platform of operating system name, as given by 'about
+		-operatingSystem' or sys.platform"""
+		name = name.lower()
+		if name.startswith("win") or name == "nt":
+			return "windows"
+		if name.startswith(("mac", "darwin")):
+			return "mac"
+		if name.startswith("linux"):
+			return "linux"
+		return None
+'''
+exec ENVIRONMENT_PROBE
+
+
+class EventBus(object):
+	"""Messages by topic, for lightweight messaging between Model and
+	Controller.
+
+	Subscribers are held by weak reference, so a subscription doesn't keep its
+	subscriber alive. Each message is only dispatched to subscribers of its
+	topic and those subscribed to every topic. post() queues messages for
+	delivery on Maya's main thread, where UI code has to run. Counts and
+	timings of dispatches are kept per topic, see getStats"""
+	def __init__(self):
+		# Topic, or None for every topic: list of subscriber references
+		self.subscribers = {}
+		# Topic: [messages emitted, subscribers called, seconds taken]
+		self.stats = {}
+		self.queue = deque()
+		self.lock = threading.Lock()
+		self.flushScheduled = False
+
+	def emit(self, *args):
+		"""Call subscribers of topic args[0] with args"""
 		topic = args[0]
-		for subscriber in self:
-			if not self[subscriber] or self[subscriber] == topic:
+		start = time.time()
+		called = 0
+		for key in (topic, None):
+			for ref in list(self.subscribers.get(key, [])):
+				subscriber = ref()
+				if subscriber is None:
+					self._remove(key, ref)
+					continue
 				try:
-					response = subscriber(*args)
-					L.debug( "Emitted message '%s' to '%s'" % (
-						args, subscriber
-					) )
+					subscriber(*args)
+					L.debug( "Emitted message '%s' to '%s'" % (args, subscriber) )
 				except:
 					L.error( "Exception while emitting message '%s' to '%s'" % (
 						args, subscriber
 					) )
 					raise
+				called += 1
+		stats = self.stats.setdefault(topic, [0, 0, 0.0])
+		stats[0] += 1
+		stats[1] += called
+		stats[2] += time.time() - start
+
+	def post(self, *args):
+		"""Emit args on Maya's main thread once it is idle. Safe to call from
+		any thread. Outside of Maya args are emitted right away"""
+		if mc is None:
+			self.emit(*args)
+			return
+		with self.lock:
+			self.queue.append(args)
+			if self.flushScheduled:
+				return
+			self.flushScheduled = True
+		import maya.utils
+		maya.utils.executeDeferred(self.flush)
+
+	def flush(self):
+		"""Emit every posted message"""
+		with self.lock:
+			messages = list(self.queue)
+			self.queue.clear()
+			self.flushScheduled = False
+		for args in messages:
+			self.emit(*args)
+
+	def subscribe(self, subscriber, filter=None):
+		"""Call subscriber with messages of topic filter, or every message if
+		filter is None"""
+		self.unsubscribe(subscriber)
+		refs = self.subscribers.setdefault(filter, [])
+		refs.append(self._getRef(subscriber, lambda ref: self._remove(filter, ref)))
+
+	def unsubscribe(self, subscriber):
+		for key, refs in self.subscribers.items():
+			for ref in list(refs):
+				if ref() == subscriber:
+					self._remove(key, ref)
+
+	def getStats(self):
+		"""Return dict of topic: dict of number of messages 'emitted',
+		'subscribers' called and 'seconds' taken"""
+		return dict([
+			(topic, {"emitted": s[0], "subscribers": s[1], "seconds": round(s[2], 6)})
+			for topic, s in self.stats.items()
+		])
+
+	def _remove(self, key, ref):
+		refs = self.subscribers.get(key, [])
+		if ref in refs:
+			refs.remove(ref)
+		if not refs:
+			self.subscribers.pop(key, None)
+
+	def _getRef(self, subscriber, callback):
+		"""Return callable returning subscriber while it is alive, else None.
+		Bound methods are recreated on every attribute access, so they are
+		referenced through their object"""
+		if getattr(subscriber, "im_self", None) is not None:
+			return WeakMethod(subscriber, callback)
+		return weakref.ref(subscriber, callback)
+
+class WeakMethod(object):
+	"""Weak reference to a bound method"""
+	def __init__(self, method, callback=None):
+		self.function = method.im_func
+		if callback is None:
+			self.object = weakref.ref(method.im_self)
+		else:
+			self.object = weakref.ref(method.im_self, lambda ref: callback(self))
 
-	def subscribe (self, subscriber, filter=None):
-		'''Add a new subscriber to self.'''
-		self[subscriber] = filter
-obs = Observable()
+	def __call__(self):
+		obj = self.object()
+		if obj is None:
+			return None
+		return self.function.__get__(obj, type(obj))
 
-class View(object):
+obs = EventBus()
 
-	def __init__(self):
+class View(object):
+	"""The installer window. Panels are built the first time they are shown,
+	with the actions of their controls bound as they are created. actions maps
+	names to callables, see Controller.getActions"""
+	def __init__(self, actions=None):
 		self.prefs = self.Preferences()
+		self.actions = actions or {}
+		self.resizeable = False
+		self.panels = {}
+		self.currentPanel = None
 
 		# Create our window
 		self.window = self._createWindow()
@@ -91,25 +332,7 @@ class View(object):
 			235,
 		)
 
-		self.introductionPanel = self.IntroductionPanel(
-			self,
-			self.contentBackground,
-			self.headline,
-		)
-
-		self.selectFolderPanel = self.SelectFolderPanel(
-			self,
-			self.contentBackground,
-			self.headline,
-			visible=False,
-		)
-
-		self.summaryPanel = self.SummaryPanel(
-			self,
-			self.contentBackground,
-			self.headline,
-			visible=False,
-		)
+		self.showPanel("introduction")
 
 		self.buttonGroup = self.ButtonGroup(
 			self,
@@ -142,6 +365,7 @@ class View(object):
 			self.pageEntryButtonSeparation = 15
 
 			self.installationStatusHeight = 180
+			self.installationDetailsHeight = 200
 
 			self.installationStatusColor = [.5,1,.25]
 			self.installationStatusShortText = "Install succeeded"
@@ -176,15 +400,15 @@ class View(object):
 		mc.deleteUI(self.prefs.window, window=True)
 
 	def setResizeable(self, bool):
+		if bool == self.resizeable:
+			return
+		self.resizeable = bool
+		# Maya only applies the sizeable state once the window is resized
 		mc.window(
 			self.prefs.window,
 			edit=True,
 			sizeable=bool,
 			maximizeButton=bool,
-		)
-		mc.window(
-			self.prefs.window,
-			edit=True,
 			width=self.prefs.width + 1,
 		)
 		mc.window(
@@ -193,6 +417,42 @@ class View(object):
 			width=self.prefs.width,
 		)
 
+	def showPanel(self, name):
+		"""Show panel 'name' and hide the one shown before. Panels are built
+		the first time they are shown"""
+		if name == self.currentPanel:
+			return
+		if self.currentPanel is not None:
+			self.panels[self.currentPanel].setVisible(False)
+		if name in self.panels:
+			self.panels[name].setVisible(True)
+		else:
+			self.panels[name] = self._createPanel(name, visible=True)
+		self.currentPanel = name
+
+	def getPanel(self, name):
+		"""Return panel 'name', building it hidden if it wasn't yet"""
+		if name not in self.panels:
+			self.panels[name] = self._createPanel(name, visible=False)
+		return self.panels[name]
+
+	def _createPanel(self, name, visible):
+		panelClass = {
+			"introduction": self.IntroductionPanel,
+			"selectFolder": self.SelectFolderPanel,
+			"summary": self.SummaryPanel,
+		}[name]
+		return panelClass(
+			self,
+			self.contentBackground,
+			self.headline,
+			visible=visible,
+		)
+
+	introductionPanel = property(lambda self: self.getPanel("introduction"))
+	selectFolderPanel = property(lambda self: self.getPanel("selectFolder"))
+	summaryPanel = property(lambda self: self.getPanel("summary"))
+
 	def _createBaseForm(self):
 		return mc.formLayout()
 
@@ -298,12 +558,16 @@ class View(object):
 
 	class Headline(object):
 		def __init__(self, parent):
+			self.label = "Welcome to the maya foundation installer"
 			self.headline = mc.text(
-				label="Welcome to the maya foundation installer",
+				label=self.label,
 				font='boldLabelFont',
 				parent=parent,
 			)
 		def setLabel(self, text):
+			if text == self.label:
+				return
+			self.label = text
 			mc.text(
 				self.headline,
 				edit=True,
@@ -313,15 +577,19 @@ class View(object):
 			return self.headline
 
 	class IntroductionPanel(object):
+		headline = "Welcome to the maya foundation installer"
+
 		def __init__(self, owner, control_parent, setLabel_control, visible=None):
 			self.owner = owner
 			self.control_parent = control_parent
 			self.setLabel_control = setLabel_control
+			self.visible = visible is not False
 
 			self.panel = mc.columnLayout(
 				adjustableColumn=2,
 				columnOffset=('both', owner.prefs.stageContentBorderSide),
 				parent=control_parent,
+				visible=self.visible,
 			)
 			owner.spacer(owner.prefs.stageContentBorderTop)
 			stageDescription1 = mc.text(
@@ -339,34 +607,37 @@ class View(object):
 			)
 			self.webbutton = mc.button(
 				label="foundation.jonlauridsen.com",
+				command=owner.getAction("website"),
 			)
-			mc.setParent('..')
-			mc.setParent('..')
-			mc.setParent('..')
+			mc.setParent(control_parent)
 
-			if visible is not None:
-				self.setVisible(visible)
+			if self.visible:
+				self.setLabel_control.setLabel(self.headline)
 
 		def setVisible(self, bool):
-			mc.layout(self.panel, edit=True, visible=bool)
+			if bool != self.visible:
+				self.visible = bool
+				mc.layout(self.panel, edit=True, visible=bool)
 			if bool:
-				self.setLabel_control.setLabel(
-					"Welcome to the maya foundation installer"
-					)
+				self.setLabel_control.setLabel(self.headline)
 
 		def __str__(self):
 			return self.panel
 
 	class SelectFolderPanel(object):
+		headline = "Choosing the Shared Scripting folder"
+
 		def __init__(self, owner, control_parent, setLabel_control, visible=None):
 			self.owner = owner
 			self.control_parent = control_parent
 			self.setLabel_control = setLabel_control
+			self.visible = visible is not False
 
 			self.panel = mc.columnLayout(
 				adjustableColumn=2,
 				columnOffset=('both', owner.prefs.stageContentBorderSide),
 				parent=control_parent,
+				visible=self.visible,
 			)
 			owner.spacer(owner.prefs.stageContentBorderTop)
 			stageDescription = mc.text(
@@ -389,6 +660,9 @@ class View(object):
 				buttonLabel='Browse...',
 				adjustableColumn=2,
 				columnWidth=[1,0],
+				buttonCommand=owner.getAction("browse"),
+				changeCommand=owner.getAction("changePath"),
+				forceChangeCommand=True,
 			)
 
 			owner.spacer(height=6)
@@ -408,20 +682,17 @@ class View(object):
 				width=300,
 			)
 
-			mc.setParent('..')
-			mc.setParent('..')
-			mc.setParent('..')
-			mc.setParent('..')
+			mc.setParent(control_parent)
 
-			if visible is not None:
-				self.setVisible(visible)
+			if self.visible:
+				self.setLabel_control.setLabel(self.headline)
 
 		def setVisible(self, bool):
-			mc.layout(self.panel, edit=True, visible=bool)
+			if bool != self.visible:
+				self.visible = bool
+				mc.layout(self.panel, edit=True, visible=bool)
 			if bool:
-				self.setLabel_control.setLabel(
-					"Choosing the Shared Scripting folder"
-				)
+				self.setLabel_control.setLabel(self.headline)
 
 		def setPathLabel(self, text):
 			if text is None:
@@ -451,15 +722,19 @@ class View(object):
 			return self.panel
 
 	class SummaryPanel(object):
+		headline = "Installation completed successfully"
+
 		def __init__(self, owner, control_parent, setLabel_control, visible=None):
 			self.owner = owner
 			self.control_parent = control_parent
 			self.setLabel_control = setLabel_control
+			self.visible = visible is not False
 
 			self.panel = mc.columnLayout(
 				adjustableColumn=2,
 				columnOffset=('both', owner.prefs.stageContentBorderSide),
 				parent=control_parent,
+				visible=self.visible,
 			)
 			owner.spacer(owner.prefs.stageContentBorderTop)
 
@@ -479,21 +754,24 @@ class View(object):
 				collapse=True,
 				width=350,
 				borderStyle="in",
+				preCollapseCommand=owner.getAction("detailsCollapse"),
+				preExpandCommand=owner.getAction("detailsExpand"),
 			)
-			mc.setParent('..')
-			mc.setParent('..')
-			mc.setParent('..')
-			mc.setParent('..')
+			mc.setParent(control_parent)
+			self.journal = None
+			self.detailsLog = None
+			self.detailsPageLabel = None
+			self.detailsPage = None
 
-			if visible is not None:
-				self.setVisible(visible)
+			if self.visible:
+				self.setLabel_control.setLabel(self.headline)
 
 		def setVisible(self, bool):
-			mc.layout(self.panel, edit=True, visible=bool)
+			if bool != self.visible:
+				self.visible = bool
+				mc.layout(self.panel, edit=True, visible=bool)
 			if bool:
-				self.setLabel_control.setLabel(
-					"Installation completed successfully"
-				)
+				self.setLabel_control.setLabel(self.headline)
 		def setPathLabel(self, text):
 			if text is None:
 				text = ""
@@ -554,29 +832,63 @@ class View(object):
 				label=text,
 			)
 
-		def spawnInstallationDetails(self, text=None):
-			"""Create UI elements to display installation summary details"""
-			if mc.layout(
-				self.installationFrameLayout,
-				query=True,
-				numberOfChildren=True
-			) == 0:
-
-				if text is None:
-					text = ""
-
-				mc.columnLayout(
-					parent=self.installationFrameLayout,
-					adjustableColumn=1,
+		def spawnInstallationDetails(self, journal):
+			"""Create UI elements to display installation summary details. Only
+			a page of the journal is shown at a time, so long installs don't
+			push all of their text into the UI"""
+			if self.detailsLog is not None:
+				return
+			self.journal = journal
+			mc.columnLayout(
+				parent=self.installationFrameLayout,
+				adjustableColumn=1,
+			)
+			self.detailsLog = mc.scrollField(
+				ww=True,
+				editable=False,
+				font='smallPlainLabelFont',
+				text=journal.getPage(0),
+				height=self.owner.prefs.installationDetailsHeight,
+			)
+			self.detailsPage = 0
+			if journal.getPageCount() > 1:
+				mc.rowLayout(
+					numberOfColumns=3,
+					adjustableColumn=2,
+					columnAlign=(2, 'center'),
 				)
-
-				log = mc.scrollField(
-					ww=True,
-					editable=False,
-					font='smallPlainLabelFont',
-					text=text,
-					height=10000, # Tall enough to never run out of height
+				self.detailsPrevious = mc.button(
+					label="< Previous",
+					command=self.owner.getAction("detailsPreviousPage"),
+				)
+				self.detailsPageLabel = mc.text(label="")
+				self.detailsNext = mc.button(
+					label="Next >",
+					command=self.owner.getAction("detailsNextPage"),
 				)
+				self._setDetailsPageControls()
+			mc.setParent(self.control_parent)
+
+		def showDetailsPage(self, page):
+			"""Show page of the installation details, counting from 0"""
+			pages = self.journal.getPageCount()
+			page = max(0, min(page, pages - 1))
+			if page == self.detailsPage:
+				return
+			self.detailsPage = page
+			mc.scrollField(self.detailsLog, edit=True, text=self.journal.getPage(page))
+			if self.detailsPageLabel is not None:
+				self._setDetailsPageControls()
+
+		def _setDetailsPageControls(self):
+			page = self.detailsPage
+			start = page * self.journal.pageSize
+			mc.text(self.detailsPageLabel, edit=True, label="Entries %d-%d of %d" % (
+				start + 1, min(start + self.journal.pageSize, len(self.journal)),
+				len(self.journal),
+			))
+			mc.button(self.detailsPrevious, edit=True, enable=page > 0)
+			mc.button(self.detailsNext, edit=True, enable=page < self.journal.getPageCount() - 1)
 
 		def __str__(self):
 			return self.panel
@@ -591,12 +903,19 @@ class View(object):
 
 			owner.spacer()
 
+			self.backEnabled = False
+			self.forwardEnabled = True
+			self.forwardText = "Continue"
+			self.forwardWidth = None
 			self.back = mc.button(
 				label="Go back",
-				enable=False,
+				enable=self.backEnabled,
+				command=owner.getAction("back"),
 			)
 			self.forward = mc.button(
-				label="Continue",
+				label=self.forwardText,
+				enable=self.forwardEnabled,
+				command=owner.getAction("forward"),
 			)
 
 			mc.setParent('..')
@@ -628,51 +947,49 @@ class View(object):
 			self._setForward(label=text)
 
 		def _setBack(self, enable=None):
-			if enable is not None:
+			if enable is not None and enable != self.backEnabled:
+				self.backEnabled = enable
 				mc.button(
 					self.back,
 					edit=True,
 					enable=enable,
 				)
 		def _setForward(self, enable=None, label=None):
-			if enable is not None:
-				mc.button(
-					self.forward,
-					edit=True,
-					enable=enable,
-				)
-			if label is not None:
-				width = mc.button(
-					self.forward,
-					query=True,
-					width=True,
-				)
+			edits = {}
+			if enable is not None and enable != self.forwardEnabled:
+				self.forwardEnabled = enable
+				edits["enable"] = enable
+			if label is not None and label != self.forwardText:
+				self.forwardText = label
+				# Keep the width the button got for its first label
+				if self.forwardWidth is None:
+					self.forwardWidth = mc.button(
+						self.forward,
+						query=True,
+						width=True,
+					)
+				edits["label"] = label
+				edits["width"] = self.forwardWidth
+			if edits:
 				mc.button(
 					self.forward,
 					edit=True,
-					label=label,
-					width=width,
+					**edits
 				)
 		def __str__(self):
 			return self.buttonGroup
 
 	# Interface element generators
 	def spacer(self, height=None, width=None):
-		e = mc.text(
-			label="",
-		)
+		size = {}
 		if height:
-			mc.text(
-				e,
-				edit=True,
-				height=height,
-			)
+			size["height"] = height
 		if width:
-			mc.text(
-				e,
-				edit=True,
-				width=width,
-			)
+			size["width"] = width
+		return mc.text(
+			label="",
+			**size
+		)
 
 	def getPathDialog(self):
 		L.warn( "This uses fileBrowserDialog which has been deprecated in 2011??" )
@@ -686,16 +1003,19 @@ class View(object):
 
 	class StepElement(object):
 		def __init__(self, owner, parent, label, enable=None):
+			self.enabled = bool(enable)
 			self.panel = mc.rowLayout(
 				numberOfColumns=2,
 				columnWidth=[1,owner.prefs.pageEntryButtonSeparation],
 				parent=parent,
+				enable=self.enabled,
 			)
 			#mc.radioCollection()
 			self.radio = mc.radioButton(
 				label="",
 				editable=False,
 				collection="steps",
+				select=self.enabled,
 			)
 			mc.text(
 				label=label,
@@ -704,14 +1024,14 @@ class View(object):
 			mc.setParent('..')
 			mc.setParent('..')
 
-			if enable is not None:
-				self._setStatus(enable)
-
 		def disable(self):
 			self._setStatus(False)
 		def enable(self):
 			self._setStatus(True)
 		def _setStatus(self, bool):
+			if bool == self.enabled:
+				return
+			self.enabled = bool
 			mc.layout(
 				self.panel,
 				edit=True,
@@ -735,82 +1055,35 @@ class View(object):
 		else:
 			print "Error in test:", test
 
-	def bindButton(self, control, action):
-		mc.button(
-			control,
-			edit=True,
-			command=action
-		)
-
-	def bindTextFieldButtonGrp(self, control, button_action, change_action):
-		mc.textFieldButtonGrp(
-			control,
-			edit=True,
-			buttonCommand=button_action,
-			changeCommand=change_action,
-			forceChangeCommand=True,
-		)
-
-	def bindFrameLayout(self, control, pcc=None, pec=None):
-		if pcc:
-			mc.frameLayout(
-				control,
-				edit=True,
-				preCollapseCommand=pcc,
-			)
-		if pec:
-			mc.frameLayout(
-				control,
-				edit=True,
-				preExpandCommand=pec,
-			)
+	def getAction(self, name):
+		"""Return action 'name', or a callable doing nothing if it isn't set"""
+		return self.actions.get(name, lambda *args: None)
 
 
 class Controller:
 	def __init__(self):
 		self.model = Model()
-		self.view = View()
+		self.view = View(self.getActions())
 		self.page = 1
 
-		self.bindEvents()
 		self.subscribe()
 
 		## HACKED AUTO PROGRESS ##
 		#self._setPath("/Users/gaggle/Projects/Shared Script/")
 
-	def bindEvents(self):
-		"""Bind View elements to controller Events"""
-		try:
-			self.view.bindButton(
-				self.view.introductionPanel.webbutton,
-				self.GoToWebsite
-			)
-
-			self.view.bindButton(
-				self.view.buttonGroup.back,
-				self.GoBack
-			)
-
-			self.view.bindButton(
-				self.view.buttonGroup.forward,
-				self.GoForward
-			)
-
-			self.view.bindTextFieldButtonGrp(
-				self.view.selectFolderPanel.sharedFolderButtonGroup,
-				self.Browse,
-				self.ChangePathField,
-			)
-
-			self.view.bindFrameLayout(
-				self.view.summaryPanel.installationFrameLayout,
-				pcc=self.InstallationDetailsCollapse,
-				pec=self.InstallationDetailsExpand,
-			)
-
-		except:
-			L.fatal( "Error during bindings" )
-			raise
+	def getActions(self):
+		"""Return controller Events by the names View binds them to"""
+		return {
+			"website": self.GoToWebsite,
+			"back": self.GoBack,
+			"forward": self.GoForward,
+			"browse": self.Browse,
+			"changePath": self.ChangePathField,
+			"detailsCollapse": self.InstallationDetailsCollapse,
+			"detailsExpand": self.InstallationDetailsExpand,
+			"detailsPreviousPage": self.InstallationDetailsPreviousPage,
+			"detailsNextPage": self.InstallationDetailsNextPage,
+		}
 
 	def subscribe(self):
 		"""Subscribe controller Events to Model messages"""
@@ -875,9 +1148,15 @@ class Controller:
 		"""Run when InstallationDetail framelayout is expanded"""
 		self.view.summaryPanel.setInstallation_short( self.getInstallationStatus() )
 
-		self.view.summaryPanel.spawnInstallationDetails(
-			self.model.getLog()
-		)
+		self.view.summaryPanel.spawnInstallationDetails(self.model.journal)
+
+	def InstallationDetailsPreviousPage(self, evt=None):
+		panel = self.view.summaryPanel
+		panel.showDetailsPage(panel.detailsPage - 1)
+
+	def InstallationDetailsNextPage(self, evt=None):
+		panel = self.view.summaryPanel
+		panel.showDetailsPage(panel.detailsPage + 1)
 
 	# === REACTIONS TO INCOMING MESSAGES === #
 	def PathChanged(self, topic, action):
@@ -924,7 +1203,7 @@ class Controller:
 	def exceptionHandler(self):
 		formatted_exception = traceback.format_exc()
 		L.warning( "Controller encountered exception: %s" % formatted_exception )
-		self.model.addLog("Exception encountered:\n%s" % formatted_exception )
+		self.model.addLog("Exception encountered:\n%s" % formatted_exception, "error")
 
 		self._switchToStep3(success=False)
 
@@ -941,9 +1220,7 @@ class Controller:
 		self.view.steps.step1()
 		self.view.setResizeable(False)
 
-		self.view.selectFolderPanel.setVisible(False)
-		self.view.summaryPanel.setVisible(False)
-		self.view.introductionPanel.setVisible(True)
+		self.view.showPanel("introduction")
 
 		self.view.buttonGroup.backDisable()
 		self.view.buttonGroup.forwardEnable()
@@ -951,14 +1228,11 @@ class Controller:
 
 	def _switchToStep2(self, evt=None):
 		"""Switch view to step2"""
+		self.view.showPanel("selectFolder")
 		self._updatePathFromPathField()
 		self.view.steps.step2()
 		self.view.setResizeable(False)
 
-		self.view.introductionPanel.setVisible(False)
-		self.view.summaryPanel.setVisible(False)
-		self.view.selectFolderPanel.setVisible(True)
-
 		self.view.buttonGroup.backEnable()
 		self.view.buttonGroup.forwardLabel("Install")
 
@@ -979,9 +1253,7 @@ class Controller:
 		self.view.steps.step3()
 		self.view.setResizeable(True)
 
-		self.view.introductionPanel.setVisible(False)
-		self.view.selectFolderPanel.setVisible(False)
-		self.view.summaryPanel.setVisible(True)
+		self.view.showPanel("summary")
 
 		self.view.buttonGroup.backDisable()
 		self.view.buttonGroup.forwardLabel("Close")
@@ -997,27 +1269,62 @@ class Controller:
 
 
 class Model:
-	def __init__(self):
-		self.platform = getMayaPlatform()
-		self.log = ""
+	def __init__(self, userScriptDir=None, userPrefDir=None):
+		"""Install to userScriptDir, defaulting to that of the running Maya.
+		Outside of Maya userScriptDir must be given, and userPrefDir defaults to
+		the one of its layout, see getDefaultPrefDir"""
+		if mc is None:
+			if userScriptDir is None:
+				raise FoundationException("userScriptDir is required outside of Maya")
+			self.platform = None
+		else:
+			self.platform = getMayaPlatform()
+		self.journal = Journal()
 		self.installationSuccess = None
+		self.installPlan = None
 
 		self.url = "http://foundation.jonlauridsen.com"
-		self.userScriptDir = self.getUserScriptDir()
+		if userScriptDir is None:
+			userScriptDir = self.getUserScriptDir()
+		if userPrefDir is None:
+			if mc is None:
+				userPrefDir = getDefaultPrefDir(userScriptDir)
+				if userPrefDir is None:
+					raise FoundationException(
+						"userPrefDir is required outside of Maya for '%s'" % userScriptDir
+					)
+			else:
+				userPrefDir = self.getUserPrefDir()
+		self.userScriptDir = userScriptDir
+		self.userPrefDir = userPrefDir
 		self.userSetupFile = os.path.join(self.userScriptDir, "userSetup.py")
 		self.foundationBootFile = os.path.join(self.userScriptDir, "foundationBoot.py")
 
 		self.sharedFolderPath = None
 		self.sharedUserSetupFile = None
-
-	def doInstall(self):
+		self.bootSettings = dict(BOOT_SETTINGS)
+		# Zip archive of the shared folder to seed the local store with, for
+		# machines that can't reach the shared folder. In Maya the bundle
+		# embedded in the installer is used, if it has one
+		self.bundleFile = None
+
+	def doInstall(self, dryRun=False):
+		"""Install, or with dryRun only work out what installing would do.
+		Return the InstallPlan, or None if it could not be made"""
+		self.installPlan = plan = None
+		# Opening the journal would create a missing user script directory,
+		# which should fail the install instead
+		if not dryRun and os.path.isdir(self.userScriptDir):
+			self.journal.openStream(self.getJournalFile())
 		try:
-			if self.willWriteSharedUserSetup():
-				self._writeSharedUserSetup()
-			self._writeOrAppendUserSetup()
-			self._writeFoundationBoot()
+			self.addLog("Installing from shared folder:\n%s" % self.sharedFolderPath,
+				sharedFolder=self.sharedFolderPath, dryRun=dryRun)
+			self.installPlan = plan = self.getInstallPlan()
+			if not dryRun:
+				plan.apply()
 		except IOError, e:
 			L.warn( "IOError during install" )
+			self.addLog("Install failed:\n%s" % e, "error")
 			obs.emit("INSTALLATION NO SUCH DIRECTORY", traceback.format_exc())
 			self.installationSuccess = False
 		except Exception:
@@ -1031,11 +1338,110 @@ class Model:
 			# the user.
 			raise
 		else:
+			if dryRun:
+				self.addLog("Dry run, no files were written")
+			for write in plan.writes:
+				self.addLog(plan.getLog(write, dryRun), "file",
+					path=write["path"], action=write["action"], sha1=write["sha1"])
+				if not dryRun and write["topic"] is not None:
+					obs.emit(write["topic"], write["path"])
+			self._seedStore(dryRun)
 			L.info( "Successful install" )
 			obs.emit("INSTALLATION SUCCESSFUL")
 			self.installationSuccess = True
+		finally:
+			self.journal.closeStream()
+		return plan
+
+	def _seedStore(self, dryRun=False):
+		"""Seed the local store with the offline bundle, if there is one. The
+		boot files are installed by then, so failing to seed is logged but
+		doesn't fail the install"""
+		bundleFile = self.bundleFile
+		embedded = bundleFile is None and hasEmbeddedBundle()
+		if dryRun:
+			if bundleFile is not None or embedded:
+				self.addLog("Would seed local copy of shared folder from offline bundle")
+			return None
+		if embedded:
+			bundleFile = writeEmbeddedBundle()
+		if bundleFile is None:
+			return None
+		try:
+			try:
+				snapshot = self.seedStore(bundleFile)
+			finally:
+				if bundleFile is not self.bundleFile:
+					os.remove(bundleFile)
+		except Exception, e:
+			L.warning( "Could not seed local store: %s" % e )
+			self.addLog("Could not seed local copy of shared folder from offline "
+				"bundle:\n%s" % e, "error")
+			return None
+		self.addLog("Seeded local copy of shared folder from offline bundle:\n%s"
+			% snapshot, snapshot=snapshot)
+		return snapshot
+
+	def seedStore(self, bundleFile):
+		"""Fill the local store's copy of the shared folder from bundleFile, as
+		foundationBoot.py's mirror mode would from the shared folder itself.
+		Return path of the copy"""
+		boot = self.getBootNamespace()
+		store = boot["getStore"]()
+		if not os.path.isdir(store.path):
+			os.makedirs(store.path)
+		tmp = tempfile.mkdtemp(prefix="foundationBundle", dir=store.path)
+		try:
+			extractBundle(bundleFile, tmp)
+			return store.sync(tmp, key=self.sharedFolderPath)
+		finally:
+			shutil.rmtree(tmp, ignore_errors=True)
+
+	def getBootNamespace(self):
+		"""Return namespace of the settings, store and import code of
+		foundationBoot.py as it will be installed. Nothing is run on loading it,
+		it only defines them"""
+		source = "\n\n".join([
+			self._getBootHeaderContent(),
+			self._getBootMirrorContent(),
+			self._getBootImportContent(),
+		])
+		namespace = {"__name__": "foundationBoot", "__file__": self.foundationBootFile}
+		exec compile(source, self.foundationBootFile, "exec") in namespace
+		return namespace
+
+	def getInstallPlan(self):
+		"""Return InstallPlan of the files to write. Files that are already
+		as they should be are planned as skipped"""
+		plan = InstallPlan()
+		if self.willWriteSharedUserSetup():
+			plan.add(self.sharedUserSetupFile, "create",
+				self._getSharedUserSetupContent(), "WROTE SHARED USER SETUP")
+		elif self.sharedUserSetupFile is not None:
+			plan.add(self.sharedUserSetupFile, "skip")
+
+		if not os.path.exists(self.userSetupFile):
+			plan.add(self.userSetupFile, "create",
+				self._getUserSetupContent(), "PROCESSED USER SETUP")
+		else:
+			content = readFile(self.userSetupFile)
+			if self.isUserSetupValid(content):
+				plan.add(self.userSetupFile, "skip", content)
+			else:
+				plan.add(self.userSetupFile, "append",
+					content + "\n" + self._getUserSetupContent(), "PROCESSED USER SETUP")
+
+		content = self._getFoundationBootContent()
+		if not os.path.exists(self.foundationBootFile):
+			plan.add(self.foundationBootFile, "create", content, "WROTE FOUNDATION BOOT")
+		elif isFileContent(self.foundationBootFile, content):
+			plan.add(self.foundationBootFile, "skip", content)
+		else:
+			plan.add(self.foundationBootFile, "overwrite", content, "WROTE FOUNDATION BOOT")
+		return plan
 
 	def openProductPage(self):
+		import webbrowser
 		webbrowser.open(self.url)
 		obs.emit("OPENED PRODUCT PAGE", self.url)
 
@@ -1070,66 +1476,31 @@ class Model:
 			return sPath + "/"
 
 	def getUserScriptDir(self):
-		if self.platform == "windows":
-			path = mc.internalVar(userPrefDir=True) + 'scripts/'
-		elif self.platform == "mac":
-			path = mc.internalVar(userScriptDir=True)
+		path = getEnvironment().userScriptDir
+		if not path:
+			raise FoundationException("Could not find Maya's user script directory")
 		L.debug( "Found script directory: '%s'" % path )
 		return path
 
-	def isUserSetupValid(self):
-		#self._getUserSetupContent(getFilter=True) in self._readFile(self.userSetupFile)
-		content = readFile(self.userSetupFile, getAsLines=True)
+	def getUserPrefDir(self):
+		path = getEnvironment().userPrefDir
+		if not path:
+			raise FoundationException("Could not find Maya's user prefs directory")
+		L.debug( "Found prefs directory: '%s'" % path )
+		return path
+
+	def isUserSetupValid(self, content=None):
+		"""Return True if userSetup.py, or content given for it, boots
+		foundation"""
+		if content is None:
+			content = readFile(self.userSetupFile)
 		filter = self._getUserSetupContent(getFilter=True)
-		for l in content:
+		for l in content.splitlines():
 			if filter in l:
 				if not l.startswith("#"):
 					return True
 		return False
 
-	def _writeOrAppendUserSetup(self):
-		if os.path.exists(self.userSetupFile):
-			if self.isUserSetupValid():
-				pass
-				#self.addLog("Skipped file as it's already valid:\n%s" % self.userSetupFile)
-			else:
-				file = writeFile(
-					self.userSetupFile, self._getUserSetupContent(), mode="a"
-				)
-				self.addLog("Appended boot information to file:\n%s" % self.userSetupFile)
-				obs.emit("PROCESSED USER SETUP", file)
-
-		else:
-			file = writeFile(
-				self.userSetupFile, self._getUserSetupContent()
-			)
-			self.addLog("Created file:\n%s" % file)
-			obs.emit("PROCESSED USER SETUP", file)
-
-	def _writeFoundationBoot(self):
-		if os.path.exists(self.foundationBootFile):
-			preexist = True
-		else:
-			preexist = False
-
-		file = writeFile(
-			self.foundationBootFile, self._getFoundationBootContent()
-		)
-
-		if preexist:
-			self.addLog("Overwrote file:\n%s" % file)
-		else:
-			self.addLog("Created file:\n%s" % file)
-
-		obs.emit("WROTE FOUNDATION BOOT", file)
-
-	def _writeSharedUserSetup(self):
-		file = writeFile(
-			self.sharedUserSetupFile, self._getSharedUserSetupContent()
-		)
-		self.addLog("Created file:\n%s" % file)
-		obs.emit("WROTE SHARED USER SETUP", file)
-
 	def willWriteSharedUserSetup(self):
 		if self.sharedUserSetupFile is None:
 			return False
@@ -1149,6 +1520,19 @@ class Model:
 		return c + additionalInfo
 
 	def _getFoundationBootContent(self):
+		blocks = [
+			self._getBootHeaderContent(),
+			self._getBootEnvironmentContent(),
+			self._getBootMirrorContent(),
+			self._getBootImportContent(),
+			self._getBootProfileContent(),
+			self._getBootPrefetchContent(),
+			self._getBootTelemetryContent(),
+			self._getBootStartContent(),
+		]
+		return "\n\n".join(blocks)
+
+	def _getBootHeaderContent(self):
 		c = '''
 		#!/usr/bin/env python
 		#
@@ -1160,13 +1544,1284 @@ class Model:
 
 		import sys, os
 
+		# Settings chosen in the installer. Each of them can be overridden by an
+		# environment variable of the same name
+		SETTINGS = {
+		%(settings)s
+		}
+
 		def getToolPath():
 			"""Return shared folder path.
 
 			This variable is set through the installer"""
-			path = '%s'
+			path = '%(toolPath)s'
 			return path
 
+		def getPrefsDir():
+			"""Return Maya's user prefs directory, as found by the installer"""
+			return '%(prefsDir)s'
+
+		def getSetting(name):
+			"""Return setting 'name', or the value of the environment variable of
+			the same name if it is set"""
+			default = SETTINGS[name]
+			value = os.environ.get(name)
+			if value is None:
+				return default
+			if isinstance(default, bool):
+				return value.lower() in ("1", "true", "yes", "on")
+			if isinstance(default, (int, float)):
+				return type(default)(value)
+			return value
+
+		def getCacheDir():
+			"""Return path of the local cache folder, which lives next to this file
+			in the user script directory"""
+			return os.path.join(
+				os.path.dirname(os.path.abspath(__file__)), "foundationCache"
+			)
+		'''
+		settings = ["\t%r: %r," % (k, self.bootSettings[k])
+			for k in sorted(self.bootSettings)]
+		return formatBlock(c) % {
+			"settings": "\n".join(settings),
+			"toolPath": self.sharedFolderPath,
+			"prefsDir": self.userPrefDir,
+		}
+
+	def _getBootEnvironmentContent(self):
+		c = '''
+		# Facts the installer found, which Maya isn't asked for again
+		INSTALLED_ENVIRONMENT = %(environment)s
+
+		def getEnvironment():
+			"""Return the Environment of this Maya session, probed once"""
+			return Environment.probe(**INSTALLED_ENVIRONMENT)
+		'''
+		facts = {"userScriptDir": self.userScriptDir, "userPrefDir": self.userPrefDir}
+		if self.platform is not None:
+			facts["platform"] = self.platform
+		return ENVIRONMENT_PROBE.strip() + "\n\n" + formatBlock(c) % {
+			"environment": repr(facts),
+		}
+
+	def _getBootMirrorContent(self):
+		c = r'''
+		import hashlib, json, shutil, stat, time
+
+		class Store(object):
+			"""Content-addressed store of local copies of shared folders.
+
+			Every file is kept once per content under objects/, named by its
+			SHA-1. Each shared folder gets a snapshot under snapshots/ made of
+			hardlinks to those objects, with an index of the size, mtime and hash
+			of its files. Shared folders on different branches of largely the same
+			tools so take up, and transfer, little more than their differences.
+
+			Once objects take up more than sizeCap bytes, snapshots are evicted in
+			order of least recent use"""
+			def __init__(self, path, sizeCap):
+				self.path = path
+				self.sizeCap = sizeCap
+				self.objectsDir = os.path.join(path, "objects")
+				self.snapshotsDir = os.path.join(path, "snapshots")
+
+			def getSnapshotPath(self, src):
+				key = hashlib.sha1(os.path.normcase(os.path.abspath(src))).hexdigest()
+				return os.path.join(self.snapshotsDir, key[:16])
+
+			def isComplete(self, src):
+				"""Return True if the last update of the snapshot of src completed"""
+				return os.path.exists(self.getSnapshotPath(src) + ".complete")
+
+			def sync(self, src, hashes=None, key=None):
+				"""Update the snapshot of src and return its path. Only files whose
+				size or mtime changed are looked at, and only those whose content
+				isn't stored yet are read. hashes may map relative paths to known
+				[size, mtime, sha1], sparing the read of files found in it. key is
+				the folder the snapshot is of, when src is a copy of it"""
+				if not os.path.isdir(src):
+					raise IOError("Could not find folder '%s'" % src)
+				snapshot = self.getSnapshotPath(key or src)
+				lock = snapshot + ".lock"
+				self._lock(lock)
+				try:
+					marker = snapshot + ".complete"
+					if os.path.exists(marker):
+						os.remove(marker)
+					added = self._update(src, snapshot, hashes or {})
+					open(marker, "w").close()
+				finally:
+					os.rmdir(lock)
+				if added:
+					self.evict(snapshot)
+				return snapshot
+
+			def use(self, snapshot):
+				"""Mark snapshot as used now"""
+				try:
+					os.utime(snapshot + ".index", None)
+				except OSError:
+					pass
+
+			def evict(self, keep):
+				"""Remove unreferenced objects, then least recently used snapshots
+				other than keep, until objects fit within sizeCap"""
+				objects = self._getObjects()
+				total = sum(objects.values())
+				if total <= self.sizeCap:
+					return
+				snapshots = self._getSnapshots()
+				for lastUsed, snapshot in [(0, None)] + snapshots:
+					if snapshot == keep:
+						continue
+					if snapshot is not None:
+						if total <= self.sizeCap:
+							break
+						removeTree(snapshot)
+						for suffix in (".index", ".complete"):
+							if os.path.exists(snapshot + suffix):
+								os.remove(snapshot + suffix)
+					referenced = set()
+					for l, other in self._getSnapshots():
+						referenced.update([e[2] for e in self._readIndex(other).values()])
+					for digest in list(objects):
+						if digest not in referenced:
+							removeFile(self._getObjectPath(digest))
+							total -= objects.pop(digest)
+
+			def _update(self, src, snapshot, hashes):
+				"""Bring snapshot up to date with src. Return number of objects
+				added to the store"""
+				index = self._readIndex(snapshot)
+				newIndex = {}
+				added = 0
+				for relPath, st in walkSharedFiles(src):
+					dst = os.path.join(snapshot, relPath)
+					entry = index.get(relPath)
+					if entry is not None and entry[:2] == [st.st_size, st.st_mtime]:
+						if os.path.exists(dst):
+							newIndex[relPath] = entry
+							continue
+					digest = None
+					known = hashes.get(relPath)
+					if known is not None and known[:2] == [st.st_size, st.st_mtime]:
+						digest = known[2]
+					if digest is None or not os.path.exists(self._getObjectPath(digest)):
+						digest = self._addObject(os.path.join(src, relPath))
+						added += 1
+					self._link(digest, dst)
+					newIndex[relPath] = [st.st_size, st.st_mtime, digest]
+
+				for relPath in index:
+					if relPath not in newIndex:
+						removeFile(os.path.join(snapshot, relPath))
+				writeFileAtomic(snapshot + ".index", json.dumps(newIndex))
+				return added
+
+			def _addObject(self, path):
+				"""Copy file at path into the store while hashing it. Return its
+				hash"""
+				if not os.path.isdir(self.objectsDir):
+					os.makedirs(self.objectsDir)
+				tmp = os.path.join(self.objectsDir, "%s.tmp" % os.getpid())
+				sha = hashlib.sha1()
+				src = open(path, "rb")
+				try:
+					dst = open(tmp, "wb")
+					try:
+						while True:
+							chunk = src.read(1024 * 1024)
+							if not chunk:
+								break
+							sha.update(chunk)
+							dst.write(chunk)
+					finally:
+						dst.close()
+				finally:
+					src.close()
+				digest = sha.hexdigest()
+				objectPath = self._getObjectPath(digest)
+				if os.path.exists(objectPath):
+					os.remove(tmp)
+				else:
+					if not os.path.isdir(os.path.dirname(objectPath)):
+						os.makedirs(os.path.dirname(objectPath))
+					# Objects are shared by snapshots and must never be edited
+					os.chmod(tmp, stat.S_IREAD)
+					os.rename(tmp, objectPath)
+				return digest
+
+			def _link(self, digest, dst):
+				"""Make dst a hardlink to object digest, or a copy where the file
+				system has no hardlinks"""
+				folder = os.path.dirname(dst)
+				if not os.path.isdir(folder):
+					os.makedirs(folder)
+				removeFile(dst)
+				# Bytecode of the previous content could pass for current
+				base = os.path.splitext(dst)[0]
+				removeFile(base + ".pyc")
+				removeFile(base + ".pyo")
+				src = self._getObjectPath(digest)
+				try:
+					makeHardLink(src, dst)
+				except (OSError, AttributeError):
+					shutil.copyfile(src, dst)
+
+			def _lock(self, lock):
+				"""Take lock, a folder, clearing it if it is left over from a Maya
+				that stopped during an update"""
+				try:
+					os.makedirs(lock)
+				except OSError:
+					if time.time() - os.stat(lock).st_mtime < 600:
+						raise IOError("Snapshot is being updated by another Maya")
+					os.rmdir(lock)
+					os.makedirs(lock)
+
+			def _getObjectPath(self, digest):
+				return os.path.join(self.objectsDir, digest[:2], digest)
+
+			def _getObjects(self):
+				"""Return dict of digest: size of every stored object"""
+				objects = {}
+				for dirpath, dirnames, filenames in os.walk(self.objectsDir):
+					for filename in filenames:
+						if not filename.endswith(".tmp"):
+							path = os.path.join(dirpath, filename)
+							objects[filename] = os.path.getsize(path)
+				return objects
+
+			def _getSnapshots(self):
+				"""Return list of (last used time, path) of snapshots, least
+				recently used first"""
+				snapshots = []
+				if os.path.isdir(self.snapshotsDir):
+					for name in os.listdir(self.snapshotsDir):
+						if name.endswith(".index"):
+							path = os.path.join(self.snapshotsDir, name)
+							snapshots.append((os.path.getmtime(path), path[:-6]))
+				snapshots.sort()
+				return snapshots
+
+			def _readIndex(self, snapshot):
+				try:
+					return json.loads(readSource(snapshot + ".index"))
+				except (IOError, ValueError):
+					return {}
+
+		def walkSharedFiles(src):
+			"""Yield relative path, using forward slashes, and stat of every file in
+			src that Maya may load. Hidden files and folders and compiled Python
+			files are skipped"""
+			def raiseError(e):
+				raise e
+			for dirpath, dirnames, filenames in os.walk(src, onerror=raiseError):
+				dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+				relDir = os.path.relpath(dirpath, src).replace(os.sep, "/")
+				for filename in filenames:
+					if filename.startswith(".") or filename.endswith((".pyc", ".pyo")):
+						continue
+					if relDir == ".":
+						relPath = filename
+					else:
+						relPath = relDir + "/" + filename
+					yield relPath, os.stat(os.path.join(dirpath, filename))
+
+		def makeHardLink(src, dst):
+			if hasattr(os, "link"):
+				os.link(src, dst)
+				return
+			# Python 2 on Windows has no os.link
+			import ctypes
+			if not ctypes.windll.kernel32.CreateHardLinkW(unicode(dst), unicode(src), None):
+				raise OSError("Could not link '%s' to '%s'" % (dst, src))
+
+		def removeFile(path):
+			"""Remove file at path if it exists, even if it is read-only"""
+			if not os.path.exists(path):
+				return
+			try:
+				os.remove(path)
+			except OSError:
+				# Mirror files are hardlinks sharing their permissions with the
+				# store object, so they are only made writable where read-only
+				# files can't be removed
+				if not sys.platform.startswith("win"):
+					raise
+				os.chmod(path, stat.S_IREAD | stat.S_IWRITE)
+				os.remove(path)
+
+		def removeTree(path):
+			"""Remove folder at path if it exists, even if it holds read-only files"""
+			def makeWritable(function, path, excinfo):
+				os.chmod(path, stat.S_IREAD | stat.S_IWRITE)
+				function(path)
+			if os.path.isdir(path):
+				shutil.rmtree(path, onerror=makeWritable)
+
+		def getStore():
+			"""Return the store, which lives next to the folders of each Maya
+			version so they all share it"""
+			path = getSetting("FOUNDATION_STORE_DIR")
+			if not path:
+				path = os.path.join(getPrefsDir(), os.pardir, os.pardir, "foundationStore")
+			return Store(
+				os.path.normpath(path), getSetting("FOUNDATION_STORE_SIZE") * 1024 * 1024
+			)
+
+		def getSnapshotPath():
+			"""Return path of the local copy of the shared folder if its last update
+			completed, else None"""
+			store = getStore()
+			if store.isComplete(getToolPath()):
+				return store.getSnapshotPath(getToolPath())
+			return None
+
+		def getBundlePath():
+			"""Return path of the current bundle made by publishFoundation.py, or
+			None if the shared folder has not been published"""
+			meta = os.path.join(getToolPath(), ".foundation")
+			try:
+				f = open(os.path.join(meta, "bundle"), "r")
+				try:
+					name = f.read().strip()
+				finally:
+					f.close()
+			except IOError:
+				return None
+			path = os.path.join(meta, "bundles", name)
+			if os.path.isfile(path):
+				return path
+			return None
+
+		def getBootPath():
+			"""Return the folder or archive to load scripts from. This depends on
+			FOUNDATION_BOOT_MODE:
+			'mirror' - a local copy of the shared folder, updated first
+			'zip' - the current bundle of the shared folder
+			otherwise the shared folder itself"""
+			mode = getSetting("FOUNDATION_BOOT_MODE")
+			if mode == "zip":
+				bundle = getBundlePath()
+				if bundle is None:
+					deferWarning("no published bundle found, loading scripts from shared folder")
+					return getToolPath()
+				return bundle
+			if mode != "mirror":
+				return getToolPath()
+
+			store = getStore()
+			mirror = store.getSnapshotPath(getToolPath())
+			manifest = loadManifest(getToolPath())
+			if manifest is not None:
+				hashes = manifest.get("files")
+			else:
+				hashes = None
+			try:
+				store.sync(getToolPath(), hashes)
+			except (IOError, OSError), e:
+				if os.path.isdir(mirror):
+					store.use(mirror)
+					deferWarning("could not update local mirror, using previous copy: %s" % e)
+					return mirror
+				deferWarning("could not create local mirror: %s" % e)
+				return getToolPath()
+			return mirror
+		'''
+		return formatBlock(c)
+
+	def _getBootImportContent(self):
+		c = r'''
+		import imp, marshal, hashlib, binascii, types, pkgutil, json, thread
+		from timeit import default_timer as timer
+
+		bytecodeCache = None
+		negativeCache = None
+		prefetcher = None
+		importGraph = None
+
+		# Source files loaded by foundationBoot's loaders, in order
+		loadedFiles = []
+
+		def getInterpreterTag():
+			"""Return name of the bytecode format of the running interpreter.
+			publishFoundation.py uses the same name when precompiling"""
+			return "py%d%d-%s" % (
+				sys.version_info[0],
+				sys.version_info[1],
+				binascii.hexlify(imp.get_magic()).decode("ascii"),
+			)
+
+		class BytecodeCache(object):
+			"""Local store of compiled shared modules for the running interpreter.
+
+			Code objects are stored by hash of their source. An index of source
+			path, mtime and size lets unchanged modules load without reading their
+			source at all"""
+			def __init__(self, path, publishedPath=None):
+				self.path = path
+				if publishedPath is not None and not os.path.isdir(publishedPath):
+					publishedPath = None
+				self.publishedPath = publishedPath
+				self.indexFile = os.path.join(path, "index")
+				self.index = self._loadIndex()
+				self.dirty = False
+				self.hits = 0
+				self.misses = 0
+
+			def fetch(self, filename, compileCode=True):
+				"""Return (code, source, digest) of source file filename. source is
+				None if code came from the cache without reading the source, code is
+				None if it was not cached and compileCode is False"""
+				start = timer()
+				st = os.stat(filename)
+				entry = self.index.get(filename)
+				if entry is not None and entry[:2] == (st.st_mtime, st.st_size):
+					code = self._load(entry[2], filename)
+					if code is not None:
+						self.hits += 1
+						addProfileTime("fs", start)
+						return code, None, entry[2]
+
+				source = readSource(filename)
+				digest = hashlib.sha1(source).hexdigest()
+				code = self._load(digest, filename)
+				start = addProfileTime("fs", start)
+				if code is not None:
+					self.hits += 1
+				elif compileCode:
+					code = self.compile(source, filename, digest)
+					addProfileTime("compile", start)
+				self.index[filename] = (st.st_mtime, st.st_size, digest)
+				self.dirty = True
+				return code, source, digest
+
+			def compile(self, source, filename, digest):
+				"""Return code object compiled from source, which is also stored"""
+				self.misses += 1
+				code = compileSource(source, filename)
+				self._store(digest, marshal.dumps(code))
+				return code
+
+			def save(self):
+				"""Write index to disk if it changed"""
+				if not self.dirty:
+					return
+				try:
+					writeFileAtomic(self.indexFile, marshal.dumps(self.index))
+				except (IOError, OSError):
+					pass
+				else:
+					self.dirty = False
+
+			def _loadIndex(self):
+				try:
+					index = marshal.loads(readSource(self.indexFile))
+				except (IOError, EOFError, ValueError, TypeError):
+					return {}
+				if isinstance(index, dict):
+					return index
+				return {}
+
+			def _load(self, digest, filename):
+				name = digest + ".code"
+				try:
+					data = readSource(os.path.join(self.path, name))
+				except IOError:
+					if self.publishedPath is None:
+						return None
+					try:
+						data = readSource(os.path.join(self.publishedPath, name))
+					except IOError:
+						return None
+					self._store(digest, data)
+				try:
+					code = marshal.loads(data)
+				except (EOFError, ValueError, TypeError):
+					return None
+				if code.co_filename != filename:
+					# The same source may live at several paths
+					code = retargetCode(code, filename)
+				return code
+
+			def _store(self, digest, data):
+				try:
+					writeFileAtomic(os.path.join(self.path, digest + ".code"), data)
+				except (IOError, OSError):
+					pass
+
+		class NegativeCache(object):
+			"""Names of top-level modules known to be missing from the shared
+			folder, kept across sessions. Adding or removing anything at the top of
+			the folder changes its modification time, which empties the cache"""
+			def __init__(self, path, root):
+				self.path = path
+				self.stamp = "%s\t%r" % (root, os.stat(root).st_mtime)
+				self.names = self._load()
+				self.dirty = False
+
+			def __contains__(self, name):
+				return name in self.names
+
+			def add(self, name):
+				self.names.add(name)
+				self.dirty = True
+
+			def save(self):
+				"""Write names to disk if they changed"""
+				if not self.dirty:
+					return
+				content = "\n".join([self.stamp] + sorted(self.names))
+				try:
+					writeFileAtomic(self.path, content)
+				except (IOError, OSError):
+					pass
+				else:
+					self.dirty = False
+
+			def _load(self):
+				try:
+					lines = readSource(self.path).splitlines()
+				except IOError:
+					return set()
+				if not lines or lines[0] != self.stamp:
+					return set()
+				return set(lines[1:])
+
+		class SharedImporter(object):
+			"""Path hook for folders below the shared folder. Each folder is listed
+			once instead of probed per import, and source modules are loaded
+			through bytecodeCache. Anything else is left to imp"""
+			root = None
+
+			def __init__(self, path):
+				if SharedImporter.root is None or not isBelow(path, SharedImporter.root):
+					raise ImportError("Not a shared folder: %s" % path)
+				self.path = path
+				self.listing = None
+				self.mtime = None
+				self.isRoot = isBelow(SharedImporter.root, path)
+
+			def find_module(self, fullname, path=None):
+				if self.isRoot and negativeCache is not None and fullname in negativeCache:
+					return None
+				try:
+					loader = self._findModule(fullname)
+				except OSError:
+					# The folder couldn't be listed, which doesn't make the module
+					# missing once the share is back
+					return None
+				if loader is None and self.isRoot and negativeCache is not None:
+					negativeCache.add(fullname)
+				return loader
+
+			def _findModule(self, fullname):
+				"""Return loader of fullname, or None if it is missing. Raises
+				OSError if the folder can't be listed"""
+				name = fullname.rpartition(".")[2]
+				listing = self._getListing()
+
+				if name in listing:
+					init = os.path.join(self.path, name, "__init__.py")
+					if os.path.isfile(init):
+						return SharedLoader(init, True)
+				if name + ".py" in listing:
+					return SharedLoader(os.path.join(self.path, name + ".py"), False)
+
+				for suffix, mode, kind in [("", None, None)] + imp.get_suffixes():
+					if name + suffix in listing:
+						# Extension modules, bytecode without source and the like
+						try:
+							found = imp.find_module(name, [self.path])
+						except ImportError:
+							return None
+						return pkgutil.ImpLoader(fullname, *found)
+				return None
+
+			def _getListing(self):
+				mtime = os.stat(self.path).st_mtime
+				if mtime != self.mtime:
+					self.listing = set(os.listdir(self.path))
+					self.mtime = mtime
+				return self.listing
+
+		class SharedLoader(object):
+			"""PEP 302 loader for a shared source module"""
+			def __init__(self, filename, isPackage):
+				self.filename = os.path.normpath(filename)
+				self.isPackage = isPackage
+
+			def load_module(self, fullname):
+				code = getCode(self.filename)
+				loadedFiles.append(self.filename)
+				module = sys.modules.get(fullname)
+				isNew = module is None
+				if isNew:
+					module = sys.modules[fullname] = imp.new_module(fullname)
+				module.__file__ = self.filename
+				module.__loader__ = self
+				if self.isPackage:
+					module.__path__ = [os.path.dirname(self.filename)]
+					module.__package__ = fullname
+				else:
+					module.__package__ = fullname.rpartition(".")[0]
+				if importGraph is not None:
+					importGraph.enter(self.filename)
+				try:
+					start = timer()
+					exec code in module.__dict__
+					addProfileTime("exec", start)
+				except:
+					if isNew:
+						del sys.modules[fullname]
+					raise
+				finally:
+					if importGraph is not None:
+						importGraph.leave()
+				return sys.modules[fullname]
+
+			def is_package(self, fullname):
+				return self.isPackage
+
+			def get_filename(self, fullname):
+				return self.filename
+
+			def get_source(self, fullname):
+				f = open(self.filename, "rU")
+				try:
+					return f.read()
+				finally:
+					f.close()
+
+			def get_data(self, path):
+				"""Return content of a file next to the module, for pkgutil.get_data"""
+				return readSource(path)
+
+		class ManifestFinder(object):
+			"""sys.meta_path finder resolving shared modules from the manifest
+			written by publishFoundation.py, without searching the shared folder.
+			Modules missing from the manifest are left to the normal path search"""
+			def __init__(self, root, modules):
+				self.root = root
+				self.modules = modules
+
+			def find_module(self, fullname, path=None):
+				entry = self.modules.get(fullname)
+				if entry is None:
+					return None
+				relPath, isPackage = entry
+				filename = os.path.join(self.root, str(relPath))
+				if "." not in fullname:
+					if self._isShadowed(fullname):
+						return None
+				elif not self._isInPath(filename, isPackage, path):
+					# The parent package isn't the shared one
+					return None
+				return ManifestLoader(self, filename, isPackage)
+
+			def disable(self):
+				"""Leave all imports to the normal path search from now on"""
+				if self in sys.meta_path:
+					sys.meta_path.remove(self)
+
+			def _isInPath(self, filename, isPackage, path):
+				"""Return True if the folder holding module filename is in path, the
+				__path__ of the package it is imported from"""
+				folder = os.path.dirname(filename)
+				if isPackage:
+					folder = os.path.dirname(folder)
+				folder = os.path.normcase(os.path.normpath(folder))
+				for entry in path or []:
+					if os.path.normcase(os.path.normpath(entry)) == folder:
+						return True
+				return False
+
+			def _isShadowed(self, name):
+				"""Return True if a sys.path entry ahead of the shared folder has
+				module 'name', which is where the normal path search would find it"""
+				if name in sys.builtin_module_names:
+					return True
+				for entry in sys.path:
+					if entry == self.root:
+						break
+					importer = pkgutil.get_importer(entry)
+					if importer is not None and importer.find_module(name) is not None:
+						return True
+				return False
+
+		class ManifestLoader(SharedLoader):
+			"""Loader for modules found through the manifest. If the manifest turns
+			out to be stale the module is imported through the normal path search"""
+			def __init__(self, finder, filename, isPackage):
+				SharedLoader.__init__(self, filename, isPackage)
+				self.finder = finder
+
+			def load_module(self, fullname):
+				isNew = fullname not in sys.modules
+				try:
+					return SharedLoader.load_module(self, fullname)
+				except (IOError, OSError):
+					if not isNew or os.path.exists(self.filename):
+						raise
+				self.finder.disable()
+				__import__(fullname)
+				return sys.modules[fullname]
+
+		def loadManifest(root):
+			"""Return the manifest written by publishFoundation.py for root, or None
+			if it is missing or older than the last change to root"""
+			try:
+				f = open(os.path.join(root, ".foundation", "manifest.json"), "r")
+				try:
+					manifest = json.load(f)
+				finally:
+					f.close()
+			except (IOError, ValueError):
+				return None
+			if abs(os.stat(root).st_mtime - manifest.get("stamp", 0)) > 0.001:
+				return None
+			return manifest
+
+		def installManifestFinder(root):
+			"""Resolve shared modules from the manifest of root, unless it is
+			missing or stale"""
+			manifest = loadManifest(root)
+			if manifest is None:
+				return None
+			finder = ManifestFinder(root, manifest.get("modules", {}))
+			sys.meta_path.append(finder)
+			return finder
+
+		def installImportHook(root):
+			"""Load source modules below root through a local bytecode cache"""
+			global bytecodeCache
+			published = os.path.join(
+				getToolPath(), ".foundation", "bytecode", getInterpreterTag()
+			)
+			bytecodeCache = BytecodeCache(
+				os.path.join(getCacheDir(), "bytecode", getInterpreterTag()),
+				published,
+			)
+			SharedImporter.root = root
+			sys.path_hooks.insert(0, SharedImporter)
+			sys.path_importer_cache.pop(root, None)
+
+			# Modules imported after startup are cached too
+			import atexit
+			atexit.register(bytecodeCache.save)
+
+			if getSetting("FOUNDATION_NEGATIVE_CACHE"):
+				global negativeCache
+				negativeCache = NegativeCache(
+					os.path.join(getCacheDir(), "missingModules.txt"), root
+				)
+				atexit.register(negativeCache.save)
+
+		def retargetCode(code, filename):
+			"""Return copy of code object, and code objects nested in it, with
+			co_filename set to filename"""
+			consts = []
+			for const in code.co_consts:
+				if isinstance(const, types.CodeType):
+					const = retargetCode(const, filename)
+				consts.append(const)
+			return types.CodeType(
+				code.co_argcount, code.co_nlocals, code.co_stacksize, code.co_flags,
+				code.co_code, tuple(consts), code.co_names, code.co_varnames,
+				filename, code.co_name, code.co_firstlineno, code.co_lnotab,
+				code.co_freevars, code.co_cellvars,
+			)
+
+		def getCode(filename):
+			"""Return code object of source file filename, taken from prefetcher
+			or bytecodeCache when they are set up"""
+			result = None
+			if prefetcher is not None:
+				start = timer()
+				result = prefetcher.take(filename)
+				addProfileTime("fs", start)
+			if result is None:
+				result = fetchCode(filename)
+			code, source, digest = result
+			if code is None:
+				start = timer()
+				if bytecodeCache is not None:
+					code = bytecodeCache.compile(source, filename, digest)
+				else:
+					code = compileSource(source, filename)
+				addProfileTime("compile", start)
+			return code
+
+		def fetchCode(filename, compileCode=True):
+			"""Return (code, source, digest) of source file filename, see
+			BytecodeCache.fetch"""
+			if bytecodeCache is not None:
+				return bytecodeCache.fetch(filename, compileCode)
+			start = timer()
+			source = readSource(filename)
+			start = addProfileTime("fs", start)
+			code = None
+			if compileCode:
+				code = compileSource(source, filename)
+				addProfileTime("compile", start)
+			return code, source, None
+
+		def compileSource(source, filename):
+			source = source.replace("\r\n", "\n").replace("\r", "\n")
+			if not source.endswith("\n"):
+				source += "\n"
+			return compile(source, filename, "exec", 0, True)
+
+		def isBelow(path, root):
+			"""Return True if path is root or a folder inside it"""
+			path = os.path.normcase(os.path.abspath(path))
+			root = os.path.normcase(os.path.abspath(root))
+			return path == root or path.startswith(os.path.join(root, ""))
+
+		def readSource(path):
+			f = open(path, "rb")
+			try:
+				return f.read()
+			finally:
+				f.close()
+
+		def writeFileAtomic(path, data):
+			"""Write data to path through a temporary file, so concurrent Maya
+			sessions, and the prefetch threads of one, never see a half-written
+			file"""
+			folder = os.path.dirname(path)
+			if not os.path.isdir(folder):
+				os.makedirs(folder)
+			tmp = "%s.%s.%s.tmp" % (path, os.getpid(), thread.get_ident())
+			f = open(tmp, "wb")
+			try:
+				f.write(data)
+			finally:
+				f.close()
+			try:
+				os.rename(tmp, path)
+			except OSError:
+				# Windows refuses to rename onto an existing file
+				if os.path.exists(path):
+					os.remove(path)
+				os.rename(tmp, path)
+		'''
+		return formatBlock(c)
+
+	def _getBootProfileContent(self):
+		c = r'''
+		import __builtin__, threading
+
+		profiler = None
+
+		class ImportProfiler(object):
+			"""Records a tree of imports of modules below roots while running.
+
+			Each node holds wall time, self time (wall time minus that of nested
+			shared imports) and, for modules loaded through foundationBoot's own
+			loaders, the time spent on file system access, compiling and executing.
+			Imports of other modules are left out, their shared imports moving up
+			to the nearest shared parent"""
+			def __init__(self, roots):
+				self.roots = roots
+				self.thread = threading.currentThread()
+				self.tree = self._newNode("")
+				self.stack = [self.tree]
+				self._import = None
+
+			def start(self):
+				self._import = __builtin__.__import__
+				__builtin__.__import__ = self._profiledImport
+				self.tree["start"] = timer()
+
+			def stop(self):
+				__builtin__.__import__ = self._import
+				self.tree["wall"] = timer() - self.tree.pop("start")
+
+			def add(self, kind, seconds):
+				"""Add time spent on kind ('fs', 'compile' or 'exec') to the import
+				being profiled"""
+				if threading.currentThread() is not self.thread:
+					return
+				node = self.stack[-1]
+				node[kind] = node.get(kind, 0.0) + seconds
+
+			def getImports(self):
+				"""Return list of every recorded import"""
+				imports = []
+				nodes = list(self.tree["children"])
+				while nodes:
+					node = nodes.pop()
+					imports.append(node)
+					nodes.extend(node["children"])
+				return imports
+
+			def _newNode(self, name):
+				return {"name": name, "file": None, "wall": 0.0, "self": 0.0, "children": []}
+
+			def _profiledImport(self, name, globals=None, locals=None, fromlist=None, level=-1):
+				node = self._newNode(name)
+				loaded = len(sys.modules)
+				self.stack.append(node)
+				start = timer()
+				try:
+					return self._import(name, globals, locals, fromlist, level)
+				finally:
+					node["wall"] = timer() - start
+					self.stack.pop()
+					if len(sys.modules) > loaded:
+						self._record(node, globals)
+
+			def _record(self, node, globals):
+				parent = self.stack[-1]
+				module = self._getModule(node["name"], globals)
+				filename = getattr(module, "__file__", None)
+				if filename is None or not [r for r in self.roots if isBelow(filename, r)]:
+					parent["children"].extend(node["children"])
+					return
+				node["name"] = module.__name__
+				node["file"] = filename
+				node["self"] = node["wall"] - sum([c["wall"] for c in node["children"]])
+				parent["children"].append(node)
+
+			def _getModule(self, name, globals):
+				"""Return module imported as name from a module with globals, which
+				may be relative to that module's package"""
+				if globals:
+					package = globals.get("__package__")
+					if package is None:
+						package = globals.get("__name__", "")
+						if "__path__" not in globals:
+							package = package.rpartition(".")[0]
+					if package:
+						module = sys.modules.get(package + "." + name)
+						if module is not None:
+							return module
+				return sys.modules.get(name)
+
+		def startProfiler(roots):
+			global profiler
+			profiler = ImportProfiler(roots)
+			profiler.start()
+
+		def stopProfiler():
+			"""Stop profiler, write its results to the user prefs directory and
+			print a summary of the slowest imports once Maya is done initializing"""
+			profiler.stop()
+			try:
+				path = os.path.join(getPrefsDir(), "foundationBootProfile.json")
+				f = open(path, "w")
+				try:
+					json.dump(profiler.tree, f, indent=1, sort_keys=True)
+				finally:
+					f.close()
+			except (IOError, OSError), e:
+				deferWarning("could not write boot profile: %s" % e)
+				path = None
+
+			import maya.utils
+			maya.utils.executeDeferred( printProfileSummary, path )
+
+		def addProfileTime(kind, start):
+			"""Add time since start to the import being profiled. Return current
+			time"""
+			now = timer()
+			if profiler is not None:
+				profiler.add(kind, now - start)
+			return now
+
+		def printProfileSummary(path):
+			imports = profiler.getImports()
+			imports.sort(key=lambda n: n["self"], reverse=True)
+			print "maya foundation: imported %d shared modules in %.3fs" % (
+				len(imports), profiler.tree["wall"]
+			)
+			print "%8s %8s %8s %8s %8s  %s" % ("wall", "self", "fs", "compile", "exec", "module")
+			for node in imports[:getSetting("FOUNDATION_PROFILE_TOP")]:
+				columns = [node["wall"], node["self"]]
+				for kind in ("fs", "compile", "exec"):
+					if kind in node:
+						columns.append("%8.3f" % node[kind])
+					else:
+						columns.append("%8s" % "-")
+				print "%8.3f %8.3f %s %s %s  %s" % tuple(columns + [node["name"]])
+			if path is not None:
+				print "maya foundation: full boot profile written to '%s'" % path
+		'''
+		return formatBlock(c)
+
+	def _getBootPrefetchContent(self):
+		c = r'''
+		from collections import deque
+
+		class Prefetcher(object):
+			"""Reads, and optionally compiles, shared modules on background threads
+			so their import on the main thread finds them in memory. The modules
+			in warmup are queued last and compiled into the bytecode cache, where
+			their import finds them, instead of being kept in memory"""
+			def __init__(self, filenames, threads, compileCode, warmup=()):
+				self.compileCode = compileCode
+				queued = set(filenames)
+				warmup = [f for f in warmup if f not in queued]
+				self.warmup = set(warmup)
+				filenames = list(filenames) + warmup
+				self.queue = deque(filenames)
+				self.queued = set(filenames)
+				self.events = dict([(f, threading.Event()) for f in filenames])
+				self.results = {}
+				self.finished = False
+				self.lock = threading.Lock()
+				for i in range(min(threads, len(filenames))):
+					thread = threading.Thread(
+						target=self._work, name="foundationPrefetch%d" % i
+					)
+					thread.setDaemon(True)
+					thread.start()
+
+			def take(self, filename):
+				"""Return (code, source, digest) of filename, see fetchCode, waiting
+				for it if it is being read. Return None if it was not prefetched or
+				was taken before, as each file is handed out once"""
+				with self.lock:
+					event = self.events.pop(filename, None)
+					if filename in self.queued:
+						# Not started yet, the caller can read it just as fast
+						self.queued.remove(filename)
+						return None
+				if event is None:
+					return None
+				event.wait()
+				return self.results.pop(filename, None)
+
+			def _work(self):
+				while True:
+					filename = None
+					with self.lock:
+						while self.queue:
+							f = self.queue.popleft()
+							if f in self.queued:
+								self.queued.remove(f)
+								filename = f
+								# take() may drop the event while the file is read
+								event = self.events[f]
+								break
+					if filename is None:
+						return
+					try:
+						result = fetchCode(
+							filename, self.compileCode or filename in self.warmup
+						)
+					except Exception:
+						# The import reads the file itself and reports any error
+						pass
+					else:
+						with self.lock:
+							if not self.finished and filename not in self.warmup:
+								self.results[filename] = result
+					event.set()
+
+			def finish(self):
+				"""Drop what startup didn't take, and keep nothing from now on"""
+				with self.lock:
+					self.finished = True
+					self.results.clear()
+
+		class ImportGraph(object):
+			"""Which shared module imports which, recorded by SharedLoader during a
+			session and merged into importGraph.json in the local cache as Maya
+			exits. Every file keeps a score of how many of the recent sessions
+			loaded it, each session weighing DECAY times the one after it"""
+			DECAY = 0.7
+			# Files loaded in most recent sessions are warmed up, while files no
+			# session loaded for a while are forgotten
+			WARMUP_SCORE = 0.5
+			FORGET_SCORE = 0.05
+
+			def __init__(self, path):
+				self.path = path
+				# Files loaded this session in order, filename: files it imported
+				self.loaded = []
+				self.imports = {}
+				self.stack = []
+
+			def enter(self, filename):
+				"""Record filename being executed, imported by the file executing"""
+				if filename not in self.imports:
+					self.loaded.append(filename)
+					self.imports[filename] = []
+				if self.stack:
+					children = self.imports[self.stack[-1]]
+					if filename not in children:
+						children.append(filename)
+				self.stack.append(filename)
+
+			def leave(self):
+				self.stack.pop()
+
+			def read(self):
+				"""Return the graph saved by earlier sessions, dict of filename:
+				{'score', 'imports'}"""
+				try:
+					return json.loads(readSource(self.path))["files"]
+				except (IOError, ValueError, KeyError, TypeError):
+					return {}
+
+			def getWarmupOrder(self):
+				"""Return the files most sessions load along with all they import,
+				each before the files it imports, in the order imports reach them"""
+				files = self.read()
+				roots = [f for f in files if files[f]["score"] >= self.WARMUP_SCORE]
+				roots.sort(key=lambda f: (-files[f]["score"], f))
+				order = []
+				seen = set()
+				for root in roots:
+					pending = [root]
+					while pending:
+						filename = pending.pop()
+						if filename in seen or filename not in files:
+							continue
+						seen.add(filename)
+						order.append(filename)
+						pending.extend(reversed(files[filename]["imports"]))
+				return order
+
+			def save(self):
+				"""Merge this session into the saved graph"""
+				if not self.loaded:
+					return
+				files = self.read()
+				for entry in files.values():
+					entry["score"] *= self.DECAY
+				for filename in self.loaded:
+					entry = files.setdefault(filename, {"score": 0.0, "imports": []})
+					entry["score"] += 1 - self.DECAY
+					imports = self.imports[filename]
+					entry["imports"] = imports + [
+						f for f in entry["imports"] if f not in imports
+					]
+				for filename in [f for f in files if files[f]["score"] < self.FORGET_SCORE]:
+					del files[filename]
+				for entry in files.values():
+					entry["score"] = round(entry["score"], 4)
+					entry["imports"] = [f for f in entry["imports"] if f in files]
+				try:
+					writeFileAtomic(self.path, json.dumps({"files": files}, sort_keys=True))
+				except (IOError, OSError):
+					pass
+
+		def startPrefetch():
+			"""Start prefetching the shared modules loaded during the last startup,
+			then warming up those the import graph says are usually loaded later"""
+			global prefetcher, importGraph
+			filenames = []
+			mode = getSetting("FOUNDATION_PREFETCH")
+			if mode in ("read", "compile"):
+				filenames = readPrefetchList()
+				if not filenames:
+					filenames = [os.path.normpath(
+						os.path.join(getToolPath(), "sharedUserSetup.py")
+					)]
+			warmup = []
+			if getSetting("FOUNDATION_WARMUP"):
+				importGraph = ImportGraph(os.path.join(getCacheDir(), "importGraph.json"))
+				# Warmed up modules are kept in the bytecode cache only
+				if bytecodeCache is not None:
+					warmup = importGraph.getWarmupOrder()
+				# Tools are imported after startup as well
+				import atexit
+				atexit.register(importGraph.save)
+			if not filenames and not warmup:
+				return
+			prefetcher = Prefetcher(
+				filenames, getSetting("FOUNDATION_PREFETCH_THREADS"), mode == "compile",
+				warmup
+			)
+
+		def getPrefetchListPath():
+			return os.path.join(getCacheDir(), "prefetch.txt")
+
+		def readPrefetchList():
+			try:
+				return readSource(getPrefetchListPath()).splitlines()
+			except IOError:
+				return []
+
+		def savePrefetchList():
+			"""Remember the shared modules loaded during startup for next time"""
+			if not loadedFiles:
+				return
+			try:
+				writeFileAtomic(getPrefetchListPath(), "\n".join(loadedFiles))
+			except (IOError, OSError):
+				pass
+		'''
+		return formatBlock(c)
+
+	def _getBootTelemetryContent(self):
+		c = r'''
+		import socket
+
+		class BootTelemetry(object):
+			"""Timings and facts of one startup, appended as a line of JSON to
+			telemetry.jsonl in the local cache. foundationTelemetry.py merges these
+			files from many machines into startup time statistics"""
+			def __init__(self):
+				self.start = self.last = timer()
+				self.record = {"phases": {}, "shareLatency": None, "fallback": None}
+
+			def mark(self, phase):
+				"""Record time spent since the previous mark as phase"""
+				now = timer()
+				self.record["phases"][phase] = round(now - self.last, 4)
+				self.last = now
+
+			def set(self, key, value):
+				self.record[key] = value
+
+			def save(self):
+				record = self.record
+				record["total"] = round(self.last - self.start, 4)
+				record["time"] = int(time.time())
+				record["host"] = socket.gethostname()
+				environment = getEnvironment()
+				record["maya"] = environment.mayaVersion
+				record["python"] = environment.pythonVersion
+				record["platform"] = sys.platform
+				record["mode"] = getSetting("FOUNDATION_BOOT_MODE")
+				if bytecodeCache is not None:
+					lookups = bytecodeCache.hits + bytecodeCache.misses
+					record["cacheHits"] = bytecodeCache.hits
+					record["cacheMisses"] = bytecodeCache.misses
+					if lookups:
+						record["cacheHitRate"] = round(bytecodeCache.hits / float(lookups), 4)
+				path = os.path.join(getCacheDir(), "telemetry.jsonl")
+				try:
+					if not os.path.isdir(getCacheDir()):
+						os.makedirs(getCacheDir())
+					if os.path.exists(path):
+						if os.path.getsize(path) > getSetting("FOUNDATION_TELEMETRY_SIZE") * 1024:
+							old = os.path.join(getCacheDir(), "telemetry.1.jsonl")
+							if os.path.exists(old):
+								os.remove(old)
+							os.rename(path, old)
+					# One short append per session, so concurrent sessions don't
+					# interleave their lines
+					f = open(path, "a")
+					try:
+						f.write(json.dumps(record, sort_keys=True) + "\n")
+					finally:
+						f.close()
+				except (IOError, OSError):
+					pass
+
+		telemetry = BootTelemetry()
+		'''
+		return formatBlock(c)
+
+	def _getBootStartContent(self):
+		c = r'''
 		def startModules():
 			"""Look for sharedUserSetup.py and import it if possible"""
 			try:
@@ -1180,12 +2835,107 @@ class Model:
 		def reportErrorDuringLoad(e, stack):
 			print stack,
 			import maya.OpenMaya
-			msg = "maya foundation failed to start: %%s" %% e
+			msg = "maya foundation failed to start: %s" % e
 			maya.OpenMaya.MGlobal.displayError(msg)
 
-		sys.path.append( getToolPath() )
-		startModules()
-		''' % self.sharedFolderPath
+		def deferWarning(msg):
+			"""Display warning once Maya is done initializing"""
+			import maya.utils
+			maya.utils.executeDeferred( reportWarningDuringLoad, msg )
+
+		def reportWarningDuringLoad(msg):
+			import maya.OpenMaya
+			maya.OpenMaya.MGlobal.displayWarning("maya foundation: %s" % msg)
+
+		def probeToolPath(timeout):
+			"""Return None if the shared folder can be listed within timeout
+			seconds, otherwise why it couldn't. The listing runs on a thread of
+			its own so an unresponsive file server can't block Maya past timeout"""
+			import threading
+			result = []
+			start = timer()
+			def probe():
+				try:
+					os.listdir(getToolPath())
+					telemetry.set("shareLatency", round(timer() - start, 4))
+					result.append(None)
+				except OSError, e:
+					result.append("could not be read (%s)" % (e.strerror or e))
+			thread = threading.Thread(target=probe, name="foundationProbe")
+			thread.setDaemon(True)
+			thread.start()
+			thread.join(timeout)
+			if not result:
+				return "could not be reached within %ss" % timeout
+			return result[0]
+
+		def boot():
+			try:
+				loadSharedScripts()
+			finally:
+				if getSetting("FOUNDATION_TELEMETRY"):
+					telemetry.save()
+
+		def loadSharedScripts():
+			timeout = getSetting("FOUNDATION_BOOT_TIMEOUT")
+			problem = None
+			if timeout > 0:
+				problem = probeToolPath(timeout)
+			if problem is not None:
+				telemetry.mark("probe")
+				snapshot = getSnapshotPath()
+				if snapshot is None:
+					telemetry.set("fallback", "none")
+					deferWarning(
+						"shared folder '%s' %s, started without shared scripts"
+						% (getToolPath(), problem)
+					)
+					return
+				telemetry.set("fallback", "snapshot")
+				deferWarning(
+					"shared folder '%s' %s, started from local mirror '%s'"
+					% (getToolPath(), problem, snapshot)
+				)
+				sys.path.append( snapshot )
+				startModules()
+				telemetry.mark("modules")
+				return
+			telemetry.mark("probe")
+
+			bootPath = getBootPath()
+			telemetry.mark("resolve")
+			if bootPath == getToolPath() and getSetting("FOUNDATION_BOOT_MODE") in ("mirror", "zip"):
+				telemetry.set("fallback", "direct")
+			if bootPath == getToolPath():
+				try:
+					if getSetting("FOUNDATION_BYTECODE_CACHE"):
+						installImportHook(bootPath)
+					if bytecodeCache is not None or getSetting("FOUNDATION_MANIFEST"):
+						startPrefetch()
+					if getSetting("FOUNDATION_MANIFEST"):
+						installManifestFinder(bootPath)
+				except Exception, e:
+					deferWarning("could not set up import hooks: %s" % e)
+			telemetry.mark("hooks")
+			sys.path.append( bootPath )
+			if getSetting("FOUNDATION_PROFILE"):
+				startProfiler([bootPath, getToolPath()])
+				startModules()
+				stopProfiler()
+			else:
+				startModules()
+			telemetry.mark("modules")
+			if bytecodeCache is not None:
+				bytecodeCache.save()
+			if negativeCache is not None:
+				negativeCache.save()
+			if prefetcher is not None:
+				prefetcher.finish()
+				savePrefetchList()
+			telemetry.mark("save")
+
+		boot()
+		'''
 		return formatBlock(c)
 
 	def _getSharedUserSetupContent(self):
@@ -1213,7 +2963,12 @@ class Model:
 		"""
 		################################################################################
 		# IMPORT BLOCK
+		# Importing tools here slows down every Maya startup. Register them in the
+		# TOOLS BLOCK instead so each is imported the first time it's used.
 		import maya.utils
+		import types
+		import time
+		import sys
 
 		# Instantiate logger class
 		import logging
@@ -1236,11 +2991,154 @@ class Model:
 		# L.setLevel(logging.DEBUG) - Logging messages above the setLevel threshhold
 		# is printed, in this case all messages would be printed.
 
+		################################################################################
+		# TOOLS BLOCK
+		class ToolRegistry(object):
+			"""Tools registered by name, each imported the first time it is run.
+
+			Register a tool with the module it lives in and the function that starts
+			it:
+			tools.register("myTool", "myStudio.myTool", "main")
+
+			Shelf buttons, menu items and the script editor then start it with:
+			import sharedUserSetup; sharedUserSetup.tools.run("myTool")
+			"""
+			def __init__(self):
+				self._tools = {}
+
+			def register(self, name, module, entry="main"):
+				"""Register tool 'name' started by function 'entry' in 'module'"""
+				self._tools[name] = (module, entry)
+
+			def run(self, name, *args, **kwargs):
+				"""Start tool 'name', importing it if needed"""
+				return self.get(name)(*args, **kwargs)
+
+			def get(self, name):
+				"""Return the function starting tool 'name', importing it if needed"""
+				module, entry = self._tools[name]
+				if module not in sys.modules:
+					L.debug( "Importing tool '%s' from '%s'" % (name, module) )
+					__import__(module)
+				return getattr(sys.modules[module], entry)
+
+			def isLoaded(self, name):
+				return self._tools[name][0] in sys.modules
+
+			def getCommand(self, name):
+				"""Return Python command starting tool 'name', for use as the command
+				of a shelf button or menu item"""
+				return "import sharedUserSetup; sharedUserSetup.tools.run(%r)" % name
+
+			def names(self):
+				return sorted(self._tools)
+
+		tools = ToolRegistry()
+		#tools.register("exampleTool", "exampleTool", "main") # Uncomment this to register exampleTool.main as "exampleTool"
+
+
+		################################################################################
+		# HOOKS BLOCK
+		class StartupHooks(object):
+			"""Startup work registered by phase and priority.
+
+			Phases run in this order:
+			"preUI" - right away, while Maya is still starting up
+			"deferred" - once Maya is done initializing
+			"idle" - a little at a time whenever Maya is idle, keeping the UI responsive
+			"onDemand" - only when run() is called with its name
+			Within a phase, hooks with a lower priority number run first.
+
+			hooks.register(warmUpMyTool, phase="idle", priority=10)
+
+			An idle hook that is a generator function runs one step per slice, so
+			long work can be split up by yielding between steps."""
+			PHASES = ("preUI", "deferred", "idle", "onDemand")
+
+			def __init__(self, idleBudget=0.02):
+				# Seconds of idle hooks to run per Maya idle event
+				self.idleBudget = idleBudget
+				self._hooks = dict([(phase, []) for phase in self.PHASES])
+				self._byName = {}
+				self._idleQueue = []
+				self._idleJob = None
+
+			def register(self, function, phase="deferred", priority=50, name=None):
+				"""Register function to run during phase. Return function"""
+				if phase not in self._hooks:
+					raise ValueError("Unknown phase '%s'" % phase)
+				if name is None:
+					name = function.__name__
+				hooks = self._hooks[phase]
+				hooks.append((priority, len(hooks), name, function))
+				self._byName[name] = function
+				return function
+
+			def run(self, name):
+				"""Run hook 'name' now, whatever its phase"""
+				return self._byName[name]()
+
+			def start(self):
+				"""Run preUI hooks and schedule the other phases"""
+				self._runPhase("preUI")
+				maya.utils.executeDeferred(self._startDeferred)
+
+			def _startDeferred(self):
+				self._runPhase("deferred")
+				self._idleQueue = [(n, f) for p, i, n, f in sorted(self._hooks["idle"])]
+				if self._idleQueue:
+					import maya.cmds
+					self._idleJob = maya.cmds.scriptJob(idleEvent=self._runIdle)
+
+			def _runPhase(self, phase):
+				for priority, index, name, function in sorted(self._hooks[phase]):
+					self._call(name, function)
+
+			def _runIdle(self):
+				"""Run idle hooks until idleBudget seconds have passed"""
+				deadline = time.time() + self.idleBudget
+				while self._idleQueue and time.time() < deadline:
+					name, work = self._idleQueue[0]
+					if isinstance(work, types.GeneratorType):
+						try:
+							work.next()
+							continue
+						except StopIteration:
+							pass
+						except Exception:
+							L.exception( "Error in startup hook '%s'" % name )
+					else:
+						result = self._call(name, work)
+						if isinstance(result, types.GeneratorType):
+							self._idleQueue[0] = (name, result)
+							continue
+					self._idleQueue.pop(0)
+
+				if not self._idleQueue and self._idleJob is not None:
+					# A scriptJob can't safely kill itself while it is running
+					maya.utils.executeDeferred(self._stopIdle)
+
+			def _stopIdle(self):
+				import maya.cmds
+				if self._idleJob is not None:
+					maya.cmds.scriptJob(kill=self._idleJob, force=True)
+					self._idleJob = None
+
+			def _call(self, name, function):
+				try:
+					return function()
+				except Exception:
+					L.exception( "Error in startup hook '%s'" % name )
+
+		hooks = StartupHooks()
+
+
 		################################################################################
 		# FUNCTIONS BLOCK
 		def executedDeferred():
 			"""These commands are run after Maya is done initializing, so here we do
-			have full access to Maya functionality"""
+			have full access to Maya functionality. Register more functions with
+			hooks to spread startup work over Maya's idle time"""
 			#exampleFunction() # Uncomment this to run this function during startup
 			reportLoaded()
 
@@ -1254,18 +3152,179 @@ class Model:
 
 		################################################################################
 		# COMMANDS BLOCK
-		maya.utils.executeDeferred( executedDeferred )
+		hooks.register( executedDeferred, phase="deferred" )
+		hooks.start()
 		'''
 		return formatBlock(c)
 
-	def addLog(self, entry):
-		l = self.log
-		if l:
-			l = l + "\n\n"
-		self.log = l + entry
+	def addLog(self, entry, kind="info", **data):
+		"""Add entry to the installation details. Return the journal entry"""
+		return self.journal.add(entry, kind, **data)
 
 	def getLog(self):
-		return self.log
+		"""Return the installation details as text"""
+		return self.journal.getText()
+
+	def getJournalFile(self):
+		return os.path.join(self.userScriptDir, "foundationCache", "install.jsonl")
+
+class Journal(object):
+	"""Installation details, as an append-only list of entries. Each entry is
+	a dict of 'time', 'kind' ('info', 'file' or 'error'), 'text' and any
+	data given with it. While a stream is open, entries are also appended to
+	it as they are added, one JSON line each, so the file keeps what happened
+	even if Maya goes down mid install"""
+	pageSize = 50
+	# Bytes the stream may grow to before it is rolled over
+	streamSize = 1024 * 1024
+
+	def __init__(self):
+		self.entries = []
+		self.stream = None
+
+	def __len__(self):
+		return len(self.entries)
+
+	def add(self, text, kind="info", **data):
+		entry = dict(data, time=time.time(), kind=kind, text=text)
+		self.entries.append(entry)
+		if self.stream is not None:
+			try:
+				self.stream.write(json.dumps(entry, sort_keys=True) + "\n")
+				self.stream.flush()
+			except (IOError, OSError):
+				L.warning( "Could not write to install log, closing it" )
+				self.closeStream()
+		return entry
+
+	def openStream(self, path):
+		"""Start appending entries to file at path. The file is kept next to
+		the installed files, so failing to open it doesn't fail the install"""
+		self.closeStream()
+		try:
+			folder = os.path.dirname(path)
+			if not os.path.isdir(folder):
+				os.makedirs(folder)
+			if os.path.exists(path) and os.path.getsize(path) > self.streamSize:
+				old = os.path.splitext(path)[0] + ".1.jsonl"
+				if os.path.exists(old):
+					os.remove(old)
+				os.rename(path, old)
+			self.stream = open(path, "a")
+		except (IOError, OSError):
+			L.warning( "Could not open install log '%s'" % path )
+
+	def closeStream(self):
+		if self.stream is not None:
+			stream, self.stream = self.stream, None
+			try:
+				stream.close()
+			except (IOError, OSError):
+				pass
+
+	def getText(self, start=0, end=None):
+		"""Return text of entries start to end, separated by blank lines"""
+		return "\n\n".join([e["text"] for e in self.entries[start:end]])
+
+	def getPageCount(self):
+		return max(1, (len(self.entries) + self.pageSize - 1) // self.pageSize)
+
+	def getPage(self, page):
+		"""Return text of entries on page, counting from 0"""
+		start = page * self.pageSize
+		return self.getText(start, start + self.pageSize)
+
+class InstallPlan(object):
+	"""Files an installation writes, worked out before any of them is
+	written. writes is a list of dicts of:
+
+	path - file to write
+	action - 'create', 'append', 'overwrite', or 'skip' when the file already
+	is as it should be
+	content - content of the file once installed, None if it isn't known
+	sha1 - hash of content
+	topic - message emitted once the file is written"""
+	logs = {
+		"create": "Created file:\n%s",
+		"append": "Appended boot information to file:\n%s",
+		"overwrite": "Overwrote file:\n%s",
+		"skip": "Kept existing file:\n%s",
+	}
+	dryRunLogs = {
+		"create": "Would create file:\n%s",
+		"append": "Would append boot information to file:\n%s",
+		"overwrite": "Would overwrite file:\n%s",
+		"skip": "Would keep existing file:\n%s",
+	}
+
+	def __init__(self):
+		self.writes = []
+
+	def add(self, path, action, content=None, topic=None):
+		if content is None:
+			digest = None
+		else:
+			digest = hashlib.sha1(content).hexdigest()
+		self.writes.append({
+			"path": path,
+			"action": action,
+			"content": content,
+			"sha1": digest,
+			"topic": topic,
+		})
+
+	def getLog(self, write, dryRun=False):
+		"""Return installation details entry of write"""
+		if dryRun:
+			return self.dryRunLogs[write["action"]] % write["path"]
+		return self.logs[write["action"]] % write["path"]
+
+	def getChanges(self):
+		"""Return the writes that change a file"""
+		return [w for w in self.writes if w["action"] != "skip"]
+
+	def apply(self):
+		"""Write every change to a temporary file next to it first, then move
+		them all into place. If anything fails every file is put back as it
+		was and the error raised"""
+		temporary = []
+		replaced = []
+		try:
+			for write in self.getChanges():
+				tmp = "%s.%s.tmp" % (write["path"], os.getpid())
+				temporary.append(tmp)
+				f = open(tmp, "w")
+				try:
+					f.write(write["content"])
+				finally:
+					f.close()
+			for write, tmp in zip(self.getChanges(), temporary):
+				path = write["path"]
+				backup = None
+				if os.path.exists(path):
+					backup = path + ".foundationBackup"
+					backupFile(path, backup)
+				# Listed before it is replaced, as replacing it on Windows removes
+				# it first and may fail after that
+				replaced.append((path, backup))
+				if backup is not None:
+					shutil.copymode(path, tmp)
+				replaceFile(tmp, path)
+				L.info( "Wrote file '%s'" % path )
+		except:
+			error = sys.exc_info()
+			for path, backup in reversed(replaced):
+				if backup is not None:
+					replaceFile(backup, path)
+				elif os.path.exists(path):
+					os.remove(path)
+			for tmp in temporary:
+				if os.path.exists(tmp):
+					os.remove(tmp)
+			raise error[0], error[1], error[2]
+		for path, backup in replaced:
+			if backup is not None:
+				os.remove(backup)
 
 
 ## HELPFUL FUNCTIONS ##
@@ -1281,28 +3340,109 @@ def readFile(filepath, getAsLines=False):
 		f.close()
 	return c
 
-def writeFile(filepath, content, mode="w"):
-	"""Write content to filepath. Return filepath"""
-	f = open(filepath, mode)
+def hasEmbeddedBundle():
+	"""Return True if the installer was run from a MEL file embedding an
+	offline bundle of the shared folder"""
+	if mc is None or not maya.mel.eval('exists "__foundation_getBundlePartCount__"'):
+		return False
+	return maya.mel.eval("__foundation_getBundlePartCount__()") > 0
+
+def writeEmbeddedBundle():
+	"""Write the offline bundle embedded in the installer's MEL file to a
+	temporary file, a part at a time. Return its path, or None if there is no
+	bundle"""
+	if not hasEmbeddedBundle():
+		return None
+	import base64
+	fd, path = tempfile.mkstemp(prefix="foundationBundle", suffix=".zip")
+	f = os.fdopen(fd, "wb")
+	try:
+		for i in range(maya.mel.eval("__foundation_getBundlePartCount__()")):
+			f.write(base64.b64decode(maya.mel.eval("__foundation_getBundlePart%d__()" % i)))
+	except:
+		f.close()
+		os.remove(path)
+		raise
+	f.close()
+	return path
+
+def extractBundle(bundleFile, dst):
+	"""Extract zip archive bundleFile into folder dst, a file at a time"""
+	import zipfile
+	archive = zipfile.ZipFile(bundleFile, "r")
+	try:
+		for info in archive.infolist():
+			path = os.path.normpath(os.path.join(dst, info.filename))
+			if not path.startswith(os.path.join(os.path.normpath(dst), "")):
+				raise FoundationException("Bundle entry '%s' is outside of the bundle" % info.filename)
+			if info.filename.endswith("/"):
+				continue
+			if not os.path.isdir(os.path.dirname(path)):
+				os.makedirs(os.path.dirname(path))
+			src = archive.open(info)
+			try:
+				f = open(path, "wb")
+				try:
+					shutil.copyfileobj(src, f)
+				finally:
+					f.close()
+			finally:
+				src.close()
+	finally:
+		archive.close()
 
-	if mode == "a":
-		content = "\n" + content
+def isFileContent(filepath, content):
+	"""Return True if file at filepath holds content, as written in text
+	mode. Files of another size are told apart without reading them"""
+	size = len(content) + content.count("\n") * (len(os.linesep) - 1)
+	if os.path.getsize(filepath) != size:
+		return False
+	return readFile(filepath) == content
 
+def backupFile(src, dst):
+	"""Keep the current content of src at dst, as a hardlink where possible"""
+	if os.path.exists(dst):
+		os.remove(dst)
+	if hasattr(os, "link"):
+		try:
+			os.link(src, dst)
+			return
+		except OSError:
+			# File systems without hardlinks, such as SMB shares
+			pass
+	shutil.copy2(src, dst)
+
+def replaceFile(src, dst):
+	"""Rename src to dst, replacing dst if it exists"""
 	try:
-		f.write( content )
-	finally:
-		f.close()
-	L.info( "Created file '%s'" % filepath )
-	return filepath
+		os.rename(src, dst)
+	except OSError:
+		# Windows refuses to rename onto an existing file
+		os.remove(dst)
+		os.rename(src, dst)
+
+def getDefaultPrefDir(userScriptDir):
+	"""Return Maya's user prefs directory for userScriptDir, as Maya lays them
+	out, or None if userScriptDir doesn't look like a Maya one"""
+	path = os.path.normpath(userScriptDir)
+	if os.path.basename(path).lower() != "scripts":
+		return None
+	parent = os.path.dirname(path)
+	if os.path.basename(parent).lower() == "prefs":
+		# Windows keeps scripts inside prefs
+		return os.path.join(parent, "")
+	return os.path.join(parent, "prefs", "")
+
+def getEnvironment():
+	"""Return the Environment of the running Maya, probed once per process"""
+	return Environment.probe()
 
 def getMayaPlatform():
-	"""Return platform as string: 'mac' or 'windows'"""
-	if mc.about(windows=True):
-		return "windows"
-	elif mc.about(mac=True):
-		return "mac"
-	else:
+	"""Return platform as string: 'mac', 'windows' or 'linux'"""
+	platform = getEnvironment().platform
+	if platform is None:
 		raise UnknownPlatformException()
+	return platform
 
 ## {{{ http://code.activestate.com/recipes/145672/ (r1)
 def formatBlock(block):
@@ -1343,59 +3483,158 @@ def _randColor(color=None):
 		return [r,g,b]
 
 
-## MODULE SELF-LOADING FUNCTIONS ##
-def wrapPyInMel(cmd):
-	cmd = maya.cmds.encodeString(cmd)
-	melcmd = 'python(\"' + cmd + '\")'
-	return melcmd
-
-def pathsplit( path ):
-	basename = os.path.basename(path)
-	dirname = os.path.dirname(path)
-	exists = os.path.exists(path)
-
-	if os.path.isdir(path) or basename is '':
-		strtype = 'dir'
-		result = {'type':strtype, 'exists':exists, 'path':dirname}
-		return result
-	elif os.path.isfile(path) or len(os.path.splitext(basename)) is 2:
-		strtype = 'file'
-		file = os.path.splitext(basename)[0]
-		ext = os.path.splitext(basename)[1]
-		result = {'type':strtype, 'exists':exists, 'path':dirname, 'file':file, 'ext':ext}
-		return result
-	else:
-		raise Exception, "could not split path '" + path + "'"
-
-def loadModule(module):
+## HEADLESS INSTALLATION ##
+def install(sharedFolder, userScriptDir=None, userPrefDir=None, settings=None,
+		dryRun=False, bundle=None):
+	"""Install maya foundation without any UI, see Model for the paths.
+	settings override BOOT_SETTINGS. With dryRun nothing is written. bundle
+	is an offline bundle to seed the local store with, see Model.bundleFile.
+	Return dict describing the installation:
+
+	success - True if every file got written
+	files - list of dicts of 'path', 'sha1' of its content and 'action'
+	taken: 'created', 'appended', 'overwrote' or 'skipped'. Nothing is
+	changed by an installation that fails
+	error - traceback of what went wrong, or None
+	log - the installation details shown by the installer window"""
+	start = time.time()
+	model = Model(userScriptDir, userPrefDir)
+	for name, value in (settings or {}).items():
+		if name not in BOOT_SETTINGS:
+			raise FoundationException("Unknown setting '%s'" % name)
+		model.bootSettings[name] = value
+	model.setSharedFolderPath(sharedFolder)
+	model.bundleFile = bundle
+
+	errors = []
+	def collect(topic, data=None):
+		if data is not None:
+			errors.append(data)
+	obs.subscribe(collect, "INSTALLATION NO SUCH DIRECTORY")
 	try:
-		filename = module.f_code.co_filename
-		file = pathsplit(filename)['file']
-	except AttributeError:
-		if type(module) is str:
-			file = module
-		else:
-			raise TypeError, "could not extract information from module of type '" + type(module).__name__ + "'. Provide a str or valid frame object"
-
-	cmd = 'import ' + file
-	melcmd = wrapPyInMel(cmd)
-
+		model.doInstall(dryRun)
+	except Exception:
+		errors.append(traceback.format_exc())
+	finally:
+		obs.unsubscribe(collect)
+
+	files = []
+	plan = model.installPlan
+	if plan is not None:
+		actions = {
+			"create": "created",
+			"append": "appended",
+			"overwrite": "overwrote",
+			"skip": "skipped",
+		}
+		for write in plan.writes:
+			action = actions[write["action"]]
+			if not model.installationSuccess:
+				action = "skipped"
+			files.append({"path": write["path"], "action": action, "sha1": write["sha1"]})
+	return {
+		"success": bool(model.installationSuccess),
+		"dryRun": dryRun,
+		"sharedFolder": model.sharedFolderPath,
+		"files": files,
+		"error": (errors or [None])[-1],
+		"log": model.getLog(),
+		"seconds": round(time.time() - start, 4),
+	}
+
+def writeSharedUserSetup(sharedFolder):
+	"""Write the default sharedUserSetup.py to sharedFolder unless it has one.
+	Return its path if it was written, else None. Installing many users at
+	once should do this first, so their installs don't all race to write it"""
+	# Only the shared folder is used, the user folders don't matter
+	model = Model(userScriptDir=sharedFolder)
+	model.setSharedFolderPath(sharedFolder)
+	if not model.willWriteSharedUserSetup():
+		return None
+	plan = InstallPlan()
+	plan.add(model.sharedUserSetupFile, "create", model._getSharedUserSetupContent())
+	plan.apply()
+	return model.sharedUserSetupFile
+
+def parseSetting(text):
+	"""Return (name, value) of setting given as NAME=VALUE, with the value
+	converted to the type of the setting's default"""
+	name, sep, value = text.partition("=")
+	if not sep or name not in BOOT_SETTINGS:
+		raise ValueError("expected NAME=VALUE with NAME one of %s" % ", ".join(sorted(BOOT_SETTINGS)))
+	default = BOOT_SETTINGS[name]
+	if isinstance(default, bool):
+		return name, value.lower() in ("1", "true", "yes", "on")
+	if isinstance(default, (int, float)):
+		return name, type(default)(value)
+	return name, value
+
+def cli(args=None):
+	"""Install from the command line and print the result as JSON. Return exit
+	status"""
+	import optparse
+	parser = optparse.OptionParser(
+		usage="%prog [options] SHARED_FOLDER",
+		description="Install maya foundation without opening the installer window.",
+	)
+	parser.add_option("--user-script-dir",
+		help="Maya user script directory to install to. Required outside of "
+		"mayapy, which otherwise has to start Maya to find it")
+	parser.add_option("--prefs-dir",
+		help="Maya user prefs directory [default: the prefs folder holding, or "
+		"next to, a user script directory named scripts]")
+	parser.add_option("--set", action="append", default=[], metavar="NAME=VALUE",
+		help="boot setting to write into foundationBoot.py, can be repeated")
+	parser.add_option("--dry-run", action="store_true", default=False,
+		help="report what installing would do without writing anything")
+	parser.add_option("--bundle", metavar="ZIP",
+		help="offline bundle of the shared folder to seed the local store with, "
+		"for machines that can't reach it")
+	options, args = parser.parse_args(args)
+	if len(args) != 1:
+		parser.error("expected exactly one SHARED_FOLDER")
 	try:
-		maya.mel.eval(melcmd)
-	except ImportError:
-		raise ImportError, "module '" + file + "' failed to be imported"
-	except RuntimeError:
-		raise RuntimeError, "could not evaluate Py command '" + cmd + "'"
-	return file
-
-try:
-	loadModule( sys._getframe() )
-except (RuntimeError, AttributeError), e:
-	print "Error loading module:", e, type(e)
-
-try:
-	controller = Controller()
-except Exception, e:
-	if L.isEnabledFor(logging.INFO):
-		traceback.print_exc()
-	print "Error initializing installation:", e, type(e)
+		settings = dict([parseSetting(s) for s in options.set])
+	except ValueError, e:
+		parser.error(str(e))
+
+	if options.user_script_dir is None:
+		if mc is None:
+			parser.error("--user-script-dir is required outside of mayapy")
+		import maya.standalone
+		maya.standalone.initialize()
+	userScriptDir = options.user_script_dir
+	if userScriptDir is not None:
+		userScriptDir = os.path.join(os.path.abspath(userScriptDir), "")
+	prefsDir = options.prefs_dir
+	if prefsDir is not None:
+		prefsDir = os.path.join(os.path.abspath(prefsDir), "")
+	elif mc is None and getDefaultPrefDir(userScriptDir) is None:
+		parser.error("--prefs-dir is required for this user script directory")
+
+	bundle = options.bundle
+	if bundle is not None:
+		bundle = os.path.abspath(bundle)
+	result = install(os.path.abspath(args[0]), userScriptDir, prefsDir, settings,
+		options.dry_run, bundle)
+	print json.dumps(result, indent=1, sort_keys=True, separators=(",", ": "))
+	if result["success"]:
+		return 0
+	return 1
+
+def main():
+	"""Open the installer window. Return its Controller"""
+	global controller
+	try:
+		controller = Controller()
+	except Exception, e:
+		if L.isEnabledFor(logging.INFO):
+			traceback.print_exc()
+		print "Error initializing installation:", e, type(e)
+		return None
+	return controller
+
+controller = None
+
+if __name__ == "__main__":
+	sys.exit(cli())
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+#
+# benchmarkBoot.py
+# mayaPyTools
+"""Benchmark Maya startup through foundationBoot.py in each boot strategy.
+
+Generates a synthetic Shared Scripting folder, publishes it, and then for each
+strategy writes foundationBoot.py with the installer and runs it outside of
+Maya, on stub maya modules, with the shared folder slowed down by latencyFS.
+Each strategy is started once with an empty local cache ('cold') and then
+'repeat' more times ('warm'), each start in a process of its own.
+
+Timings and the number of file system calls made on the shared folder are
+compared to bootBaseline.json. More calls than the baseline, or a time more
+than 'tolerance' slower, counts as a regression and makes the script exit
+with status 1. Timings depend on the machine, so update the baseline with
+--update-baseline when moving to another one.
+
+usage: benchmarkBoot.py [options]
+"""
+
+import optparse
+import tempfile
+import shutil
+import json
+import sys
+import os
+
+from timeit import default_timer as timer
+
+import shareGenerator
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+INSTALLER_DIR = os.path.dirname(TEST_DIR)
+BIN_DIR = os.path.join(os.path.dirname(INSTALLER_DIR), "bin")
+BASELINE = os.path.join(TEST_DIR, "bootBaseline.json")
+
+# Boot strategies by name, with the settings they write into foundationBoot.py
+STRATEGIES = [
+	("plain", {
+		"FOUNDATION_BYTECODE_CACHE": False,
+		"FOUNDATION_MANIFEST": False,
+		"FOUNDATION_NEGATIVE_CACHE": False,
+		"FOUNDATION_PREFETCH": "off",
+	}),
+	("direct", {}),
+	("compile", {"FOUNDATION_PREFETCH": "compile"}),
+	("mirror", {"FOUNDATION_BOOT_MODE": "mirror"}),
+	("zip", {"FOUNDATION_BOOT_MODE": "zip"}),
+]
+
+def runBoot(config):
+	"""Write foundationBoot.py as described by config and time its import.
+	Runs in a process of its own, see runStrategy"""
+	import mayaStubs
+	cmds = mayaStubs.installMayaStubs(config["userScriptDir"], config["userPrefDir"])
+	sys.path.insert(0, INSTALLER_DIR)
+	import foundation_installer
+	model = foundation_installer.Model()
+	model.setSharedFolderPath(config["share"])
+	model.bootSettings.update(config["settings"])
+	f = open(os.path.join(config["userScriptDir"], "foundationBoot.py"), "w")
+	try:
+		f.write(model._getFoundationBootContent())
+	finally:
+		f.close()
+
+	from latencyFS import LatencyFS
+	fs = LatencyFS(config["share"], config["latency"])
+	sys.path.insert(0, config["userScriptDir"])
+	cmds.reset()
+	fs.install()
+	try:
+		start = timer()
+		import foundationBoot
+		mayaStubs.runDeferred()
+		elapsed = timer() - start
+	finally:
+		fs.uninstall()
+	return {
+		"time": round(elapsed, 4),
+		"calls": fs.total(),
+		"callsByKind": fs.calls,
+		"mayaCalls": cmds.total(),
+		"messages": mayaStubs.MGlobal.messages,
+	}
+
+def runStrategy(share, settings, latency, repeat, tmp):
+	"""Start Maya in a strategy once cold and 'repeat' times warm. Return dict
+	of 'cold' and 'warm' results, warm ones being the median of the starts"""
+	userScriptDir = tempfile.mkdtemp(dir=tmp)
+	userPrefDir = tempfile.mkdtemp(dir=tmp)
+	settings = dict(settings, FOUNDATION_STORE_DIR=tempfile.mkdtemp(dir=tmp))
+	config = {
+		"share": share,
+		"settings": settings,
+		"latency": latency,
+		"userScriptDir": userScriptDir + os.sep,
+		"userPrefDir": userPrefDir + os.sep,
+	}
+	results = [runChild(config, tmp) for i in range(repeat + 1)]
+	warm = sorted(results[1:], key=lambda r: r["time"])
+	return {"cold": results[0], "warm": warm[len(warm) // 2]}
+
+def runChild(config, tmp):
+	import subprocess
+	configPath = os.path.join(tmp, "config.json")
+	resultPath = os.path.join(tmp, "result.json")
+	writeJson(configPath, config)
+	# Settings in the environment would override those of the strategy
+	env = dict([(k, v) for k, v in os.environ.items() if not k.startswith("FOUNDATION_")])
+	subprocess.check_call(
+		[sys.executable, os.path.abspath(__file__), "--child", configPath, resultPath],
+		env=env, cwd=tmp,
+	)
+	result = readJson(resultPath)
+	for kind, msg in result["messages"]:
+		print "  %s: %s" % (kind, msg)
+	return result
+
+def benchmark(options, strategies):
+	"""Return dict of strategy name: results, see runStrategy"""
+	tmp = tempfile.mkdtemp(prefix="foundationBenchmark")
+	try:
+		share = os.path.join(tmp, "share")
+		shareGenerator.generateShare(share, options.modules, options.depth,
+			options.size, options.fanout, options.missing)
+		sys.path.insert(0, BIN_DIR)
+		import publishFoundation
+		publishFoundation.L.setLevel(publishFoundation.logging.WARNING)
+		publishFoundation.writeManifest(share)
+		publishFoundation.publishFoundation(share, version="benchmark")
+
+		results = {}
+		for name, settings in STRATEGIES:
+			if name in strategies:
+				print "Running %s..." % name
+				results[name] = runStrategy(share, settings, options.latency,
+					options.repeat, tmp)
+		return results
+	finally:
+		shutil.rmtree(tmp, ignore_errors=True)
+
+def compareToBaseline(results, baseline, tolerance):
+	"""Print results next to baseline. Return number of regressions"""
+	regressions = 0
+	print "%-10s%-6s%10s%10s%10s%10s" % ("strategy", "run", "time", "baseline",
+		"calls", "baseline")
+	for name, settings in STRATEGIES:
+		if name not in results:
+			continue
+		for run in ("cold", "warm"):
+			result = results[name][run]
+			base = baseline.get(name, {}).get(run)
+			flags = []
+			if base is None:
+				baseTime = baseCalls = "-"
+			else:
+				baseTime, baseCalls = "%.3f" % base["time"], base["calls"]
+				if result["calls"] > base["calls"]:
+					flags.append("more calls")
+				if result["time"] > base["time"] * (1 + tolerance):
+					flags.append("slower")
+			regressions += len(flags)
+			print "%-10s%-6s%10.3f%10s%10d%10s  %s" % (name, run, result["time"],
+				baseTime, result["calls"], baseCalls, ", ".join(flags))
+	return regressions
+
+def getShareOptions(options):
+	return {
+		"modules": options.modules,
+		"depth": options.depth,
+		"size": options.size,
+		"fanout": options.fanout,
+		"missing": options.missing,
+		"latency": options.latency,
+	}
+
+def readJson(path):
+	f = open(path, "r")
+	try:
+		return json.load(f)
+	finally:
+		f.close()
+
+def writeJson(path, data):
+	f = open(path, "w")
+	try:
+		json.dump(data, f, indent=1, sort_keys=True, separators=(",", ": "))
+	finally:
+		f.close()
+
+def main():
+	if sys.argv[1:2] == ["--child"]:
+		writeJson(sys.argv[3], runBoot(readJson(sys.argv[2])))
+		return
+
+	parser = optparse.OptionParser(usage="%prog [options]")
+	parser.add_option("--modules", type="int", default=200,
+		help="modules in the shared folder [default: %default]")
+	parser.add_option("--depth", type="int", default=2,
+		help="package nesting depth [default: %default]")
+	parser.add_option("--size", type="int", default=2048,
+		help="bytes per module [default: %default]")
+	parser.add_option("--fanout", type="int", default=3,
+		help="imports per module [default: %default]")
+	parser.add_option("--missing", type="int", default=5,
+		help="imports of missing modules at startup [default: %default]")
+	parser.add_option("--latency", type="float", default=0.002,
+		help="seconds added to each file system call [default: %default]")
+	parser.add_option("--repeat", type="int", default=3,
+		help="warm starts per strategy [default: %default]")
+	parser.add_option("--strategy", action="append", default=[],
+		help="strategy to run, can be repeated [default: all of %s]"
+		% ", ".join([n for n, s in STRATEGIES]))
+	parser.add_option("--tolerance", type="float", default=0.25,
+		help="fraction a time may exceed its baseline by [default: %default]")
+	parser.add_option("--update-baseline", action="store_true",
+		help="store the results as the new baseline")
+	options, args = parser.parse_args()
+
+	strategies = options.strategy or [n for n, s in STRATEGIES]
+	results = benchmark(options, strategies)
+
+	baseline = {}
+	if os.path.exists(BASELINE):
+		baseline = readJson(BASELINE)
+		if baseline.get("options") != getShareOptions(options):
+			print "Baseline was made with other options, not comparing"
+			baseline = {}
+	regressions = compareToBaseline(results, baseline.get("results", {}), options.tolerance)
+
+	if options.update_baseline:
+		stored = dict(baseline.get("results", {}))
+		for name in results:
+			stored[name] = dict([(run, {"time": r["time"], "calls": r["calls"]})
+				for run, r in results[name].items()])
+		writeJson(BASELINE, {"options": getShareOptions(options), "results": stored})
+		print "Updated baseline '%s'" % BASELINE
+	elif regressions:
+		sys.exit(1)
+
+if __name__ == "__main__":
+	main()
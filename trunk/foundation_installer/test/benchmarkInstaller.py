@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+#
+# benchmarkInstaller.py
+# mayaPyTools
+"""Count the maya.cmds calls the installer window makes.
+
+Every call goes through Maya's UI layer, which is slow over remote desktop
+sessions. The installer is opened on stub maya modules and walked through
+an installation, counting calls by command for opening the window and for
+each step. Calls are compared to installerBaseline.json. More calls than the
+baseline for opening the window, or in total, make the script exit with
+status 1. Work moving between later steps is not counted against them.
+
+usage: benchmarkInstaller.py [--update-baseline]
+"""
+
+import tempfile
+import shutil
+import json
+import sys
+import os
+
+import mayaStubs
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+INSTALLER_DIR = os.path.dirname(TEST_DIR)
+BASELINE = os.path.join(TEST_DIR, "installerBaseline.json")
+OPEN = "open"
+TOTAL = "total"
+
+def countCalls(tmp):
+	"""Return list of (stage, calls by command) of an installation"""
+	userScriptDir = os.path.join(tmp, "scripts") + os.sep
+	share = os.path.join(tmp, "share")
+	os.makedirs(userScriptDir)
+	os.makedirs(share)
+	cmds = mayaStubs.installMayaStubs(userScriptDir, os.path.join(tmp, "prefs") + os.sep)
+	sys.path.insert(0, INSTALLER_DIR)
+
+	stages = []
+	def stage(name):
+		stages.append((name, cmds.calls))
+		cmds.reset()
+
+	import foundation_installer
+	controller = foundation_installer.main()
+	stage(OPEN)
+	controller.GoForward()
+	stage("select folder")
+	controller._setPath(share)
+	stage("set path")
+	controller.GoBack()
+	controller.GoForward()
+	stage("back and forth")
+	controller.GoForward()
+	stage("install")
+	controller.InstallationDetailsExpand()
+	controller.InstallationDetailsCollapse()
+	stage("details")
+	return stages
+
+def main():
+	tmp = tempfile.mkdtemp(prefix="foundationBenchmark")
+	try:
+		stages = countCalls(tmp)
+	finally:
+		shutil.rmtree(tmp, ignore_errors=True)
+
+	baseline = {}
+	if os.path.exists(BASELINE):
+		f = open(BASELINE, "r")
+		try:
+			baseline = json.load(f)
+		finally:
+			f.close()
+
+	totals = dict([(name, sum(calls.values())) for name, calls in stages])
+	totals[TOTAL] = sum(totals.values())
+	allCalls = {}
+	for name, calls in stages:
+		for command, n in calls.items():
+			allCalls[command] = allCalls.get(command, 0) + n
+
+	regressions = 0
+	print "%-16s%10s%10s  %s" % ("stage", "calls", "baseline", "by command")
+	for name, calls in stages + [(TOTAL, allCalls)]:
+		base = baseline.get(name, "-")
+		flag = ""
+		if name in (OPEN, TOTAL) and base != "-" and totals[name] > base:
+			regressions += 1
+			flag = "more calls: "
+		byCommand = ", ".join(["%s %d" % (c, n) for c, n in sorted(calls.items())])
+		print "%-16s%10d%10s  %s%s" % (name, totals[name], base, flag, byCommand)
+
+	if sys.argv[1:] == ["--update-baseline"]:
+		f = open(BASELINE, "w")
+		try:
+			json.dump(totals, f, indent=1, sort_keys=True, separators=(",", ": "))
+		finally:
+			f.close()
+		print "Updated baseline '%s'" % BASELINE
+	elif regressions:
+		sys.exit(1)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+#
+# latencyFS.py
+# mayaPyTools
+"""Simulates a slow file server by delaying file system calls on a folder.
+
+Calls are made through the os module, open() and the imp and zipimport
+modules. Python's own import statement searches folders in C, which can't be
+wrapped, so a path hook routing plain folders through imp is installed as
+well. Calls made in C by imp and zipimport are charged as the number of file
+system calls they make in turn"""
+
+import __builtin__
+import threading
+import zipimport
+import time
+import imp
+import sys
+import os
+
+
+class LatencyFS(object):
+	"""Delays each file system call on paths below root by latency seconds and
+	counts them in 'calls', kind of call: number"""
+	def __init__(self, root, latency):
+		self.root = os.path.normcase(os.path.abspath(root))
+		self.latency = latency
+		self.calls = {}
+		self.lock = threading.Lock()
+		self.originals = []
+
+	def install(self):
+		self._patch(os, "stat", self._wrap("stat", os.stat))
+		self._patch(os, "lstat", self._wrap("stat", os.lstat))
+		self._patch(os, "listdir", self._wrap("listdir", os.listdir))
+		self._patch(os, "access", self._wrap("stat", os.access))
+		self._patch(os, "utime", self._wrap("utime", os.utime))
+		self._patch(__builtin__, "open", self._wrap("open", open))
+		# A folder is searched for a package and then each module suffix
+		cost = len(imp.get_suffixes()) + 1
+		self._patch(imp, "find_module", self._wrapFindModule(imp.find_module, cost))
+		# Loading source checks for bytecode first
+		self._patch(imp, "load_module", self._wrapLoadModule(imp.load_module, 2))
+		self._patch(imp, "load_source", self._wrap("load", imp.load_source, 2, 1))
+		self._patch(sys, "path_hooks", [self._zipHook] + [
+			h for h in sys.path_hooks if h is not zipimport.zipimporter
+		] + [self._folderHook])
+		sys.path_importer_cache.clear()
+
+	def uninstall(self):
+		for module, name, value in reversed(self.originals):
+			setattr(module, name, value)
+		self.originals = []
+		sys.path_importer_cache.clear()
+
+	def total(self):
+		"""Return number of calls made on root so far"""
+		return sum(self.calls.values())
+
+	def isBelow(self, path):
+		if not isinstance(path, basestring):
+			return False
+		path = os.path.normcase(os.path.abspath(path))
+		return path == self.root or path.startswith(self.root + os.sep)
+
+	def charge(self, kind, cost=1):
+		"""Count a call of kind and wait as long as cost calls would take"""
+		with self.lock:
+			self.calls[kind] = self.calls.get(kind, 0) + cost
+		if self.latency:
+			time.sleep(self.latency * cost)
+
+	def _patch(self, module, name, value):
+		self.originals.append((module, name, getattr(module, name)))
+		setattr(module, name, value)
+
+	def _wrap(self, kind, function, cost=1, pathArg=0):
+		def wrapper(*args, **kwargs):
+			if len(args) > pathArg and self.isBelow(args[pathArg]):
+				self.charge(kind, cost)
+			return function(*args, **kwargs)
+		return wrapper
+
+	def _wrapFindModule(self, function, cost):
+		def find_module(name, path=None):
+			if path is None:
+				path = sys.path
+			for folder in path:
+				if self.isBelow(folder):
+					self.charge("find_module", cost)
+			return function(name, path)
+		return find_module
+
+	def _wrapLoadModule(self, function, cost):
+		def load_module(name, file, filename, details):
+			if details[2] == imp.PY_SOURCE and self.isBelow(filename):
+				self.charge("load", cost)
+			return function(name, file, filename, details)
+		return load_module
+
+	def _zipHook(self, path):
+		if not self.isBelow(path):
+			return zipimport.zipimporter(path)
+		# Reading the archive's table of contents
+		self.charge("zipimport")
+		return LatencyZipImporter(self, path)
+
+	def _folderHook(self, path):
+		"""Import from folders below root through imp, whose calls are charged"""
+		if not self.isBelow(path) or not os.path.isdir(path):
+			raise ImportError("not a folder below %s" % self.root)
+		import pkgutil
+		return pkgutil.ImpImporter(path)
+
+
+class LatencyZipImporter(zipimport.zipimporter):
+	"""zipimporter charging one read of the archive per module loaded"""
+	def __init__(self, fs, path):
+		zipimport.zipimporter.__init__(self, path)
+		self.fs = fs
+
+	def load_module(self, fullname):
+		self.fs.charge("zipimport")
+		return zipimport.zipimporter.load_module(self, fullname)
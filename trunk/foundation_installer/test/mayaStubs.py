@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+#
+# mayaStubs.py
+# mayaPyTools
+"""Stand-ins for the maya modules used by the installer and foundationBoot.py,
+so both can run outside of Maya.
+
+maya.cmds counts every call by command name. UI commands return made up names
+of the controls they create and queries return the flag as last set on the
+control, which is enough for the installer window to build without a UI"""
+
+import types
+import sys
+
+
+class StubCmds(types.ModuleType):
+	"""maya.cmds replacement counting calls in 'calls', command name: number"""
+	queryDefaults = {"text": "", "label": ""}
+	operatingSystems = {"windows": "win64", "mac": "mac", "linux": "linux64"}
+
+	def __init__(self, userScriptDir, userPrefDir, platform):
+		types.ModuleType.__init__(self, "maya.cmds")
+		self.userScriptDir = userScriptDir
+		self.userPrefDir = userPrefDir
+		self.platform = platform
+		self.calls = {}
+		self.controls = 0
+		# Flags of each control as created and last edited, answering queries
+		self.state = {}
+
+	def __getattr__(self, name):
+		if name.startswith("__"):
+			raise AttributeError(name)
+		def command(*args, **kwargs):
+			self.calls[name] = self.calls.get(name, 0) + 1
+			return self._run(name, args, kwargs)
+		command.__name__ = name
+		return command
+
+	def reset(self):
+		"""Forget calls made so far"""
+		self.calls = {}
+
+	def total(self):
+		"""Return number of calls made so far"""
+		return sum(self.calls.values())
+
+	def _run(self, name, args, kwargs):
+		if name == "about":
+			if kwargs.get("operatingSystem"):
+				return self.operatingSystems[self.platform]
+			if kwargs.get(self.platform):
+				return True
+			if kwargs.get("version"):
+				return "2012"
+			return False
+		if name == "internalVar":
+			if kwargs.get("userScriptDir"):
+				return self.userScriptDir
+			if kwargs.get("userPrefDir"):
+				return self.userPrefDir
+			return ""
+		if name == "encodeString":
+			return args[0].replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+		if kwargs.get("exists") or kwargs.get("ex"):
+			return False
+		if kwargs.get("query") or kwargs.get("q"):
+			state = self.state.get(args[0], {})
+			for flag in kwargs:
+				if flag not in ("query", "q"):
+					return state.get(flag, self.queryDefaults.get(flag, 0))
+			return None
+		if kwargs.get("edit") or kwargs.get("e"):
+			self.state.setdefault(args[0], {}).update(kwargs)
+			return None
+		self.controls += 1
+		control = "%s%d" % (name, self.controls)
+		self.state[control] = kwargs
+		return control
+
+
+class MGlobal(object):
+	"""maya.OpenMaya.MGlobal replacement keeping displayed messages"""
+	messages = []
+
+	@classmethod
+	def displayError(cls, msg):
+		cls.messages.append(("error", msg))
+
+	@classmethod
+	def displayWarning(cls, msg):
+		cls.messages.append(("warning", msg))
+
+	@classmethod
+	def displayInfo(cls, msg):
+		cls.messages.append(("info", msg))
+
+
+def installMayaStubs(userScriptDir, userPrefDir, platform="mac"):
+	"""Put stub maya modules in sys.modules. Return the maya.cmds stub"""
+	maya = types.ModuleType("maya")
+	cmds = StubCmds(userScriptDir, userPrefDir, platform)
+
+	mel = types.ModuleType("maya.mel")
+	mel.eval = lambda command: ""
+
+	utils = types.ModuleType("maya.utils")
+	utils.deferred = []
+	utils.executeDeferred = lambda function, *args: utils.deferred.append((function, args))
+	utils.executeInMainThreadWithResult = lambda function, *args: function(*args)
+
+	openMaya = types.ModuleType("maya.OpenMaya")
+	openMaya.MGlobal = MGlobal
+
+	maya.cmds, maya.mel, maya.utils, maya.OpenMaya = cmds, mel, utils, openMaya
+	sys.modules.update({
+		"maya": maya,
+		"maya.cmds": cmds,
+		"maya.mel": mel,
+		"maya.utils": utils,
+		"maya.OpenMaya": openMaya,
+	})
+	return cmds
+
+def runDeferred():
+	"""Run the calls queued with maya.utils.executeDeferred, as Maya does once
+	it is done initializing"""
+	utils = sys.modules["maya.utils"]
+	while utils.deferred:
+		function, args = utils.deferred.pop(0)
+		function(*args)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+#
+# shareGenerator.py
+# mayaPyTools
+"""Writes synthetic Shared Scripting folders for benchmarking startup.
+
+Modules are spread over nested packages and import each other, always a
+module written before them, so the imports form a graph without cycles.
+sharedUserSetup.py imports every module nothing else imports, so the whole
+folder gets loaded during startup, and tries a few imports of modules that
+don't exist, like tools probing for optional libraries do"""
+
+import random
+import os
+
+
+def generateShare(path, modules=200, depth=2, size=2048, fanout=3, missing=5, seed=0):
+	"""Write a shared folder to path holding 'modules' modules of about 'size'
+	bytes each, in packages nested 'depth' deep, each importing up to 'fanout'
+	other modules. Return list of the module names"""
+	rand = random.Random(seed)
+	names = [getModuleName(i, depth) for i in range(modules)]
+	imported = set()
+	for i, name in enumerate(names):
+		imports = rand.sample(names[:i], min(fanout, i))
+		imported.update(imports)
+		writeModule(path, name, getModuleContent(name, imports, size))
+
+	roots = [n for n in names if n not in imported]
+	lines = ['"""Generated startup script"""']
+	lines.extend(["import %s" % n for n in roots])
+	for i in range(missing):
+		lines.extend([
+			"try:",
+			"\timport optionalLibrary%d" % i,
+			"except ImportError:",
+			"\tpass",
+		])
+	writeFile(os.path.join(path, "sharedUserSetup.py"), "\n".join(lines) + "\n")
+	return names
+
+def getModuleName(i, depth):
+	"""Return dotted name of module i. Packages fan out four ways per level"""
+	packages = ["pkg%d" % (i // 4 ** level % 4) for level in range(depth, 0, -1)]
+	return ".".join(packages + ["mod%04d" % i])
+
+def getModuleContent(name, imports, size):
+	lines = ['"""Generated module %s"""' % name]
+	lines.extend(["import %s" % n for n in imports])
+	lines.extend([
+		"",
+		"def run(value=0):",
+		"\treturn value + %d" % len(imports),
+		"",
+	])
+	content = "\n".join(lines)
+	# Pad with comments, which the compiler skips as fast as real code, up to
+	# the wanted size
+	padding = "# " + "x" * 76 + "\n"
+	while len(content) + len(padding) <= size:
+		content += padding
+	return content
+
+def writeModule(root, name, content):
+	"""Write module 'name' below root, creating its packages"""
+	parts = name.split(".")
+	folder = root
+	for part in parts[:-1]:
+		folder = os.path.join(folder, part)
+		init = os.path.join(folder, "__init__.py")
+		if not os.path.exists(init):
+			if not os.path.isdir(folder):
+				os.makedirs(folder)
+			writeFile(init, "")
+	writeFile(os.path.join(folder, parts[-1] + ".py"), content)
+
+def writeFile(path, content):
+	f = open(path, "w")
+	try:
+		f.write(content)
+	finally:
+		f.close()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+#
+# testImport.py
+# mayaPyTools
+"""Tests of the import hooks of foundationBoot.py, run outside of Maya on stub
+maya modules.
+
+usage: python -m unittest discover -p "test*.py"
+"""
+
+import unittest
+import inspect
+import pkgutil
+import tempfile
+import shutil
+import sys
+import os
+
+from testPrefetch import getBootNamespace, writeFile
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+BIN_DIR = os.path.join(os.path.dirname(os.path.dirname(TEST_DIR)), "bin")
+PACKAGE = "foundationTestPackage"
+
+
+class ImportTest(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp(prefix="foundationTest")
+		self.boot = getBootNamespace(self.tmp)
+		self.share = os.path.join(self.tmp, "share")
+		self.local = os.path.join(self.tmp, "local")
+		writeFile(os.path.join(self.share, PACKAGE, "__init__.py"), "")
+		writeFile(os.path.join(self.share, PACKAGE, "shared.py"), "def f():\n\treturn 1\n")
+		writeFile(os.path.join(self.share, PACKAGE, "data.txt"), "hello\n")
+		writeFile(os.path.join(self.local, PACKAGE, "__init__.py"), "")
+		writeFile(os.path.join(self.local, PACKAGE, "local.py"), "")
+		if BIN_DIR not in sys.path:
+			sys.path.insert(0, BIN_DIR)
+		import publishFoundation
+		publishFoundation.L.setLevel(publishFoundation.logging.WARNING)
+		publishFoundation.writeManifest(self.share)
+		self.path = sys.path[:]
+		self.metaPath = sys.meta_path[:]
+		self.pathHooks = sys.path_hooks[:]
+
+	def tearDown(self):
+		sys.path[:] = self.path
+		sys.meta_path[:] = self.metaPath
+		sys.path_hooks[:] = self.pathHooks
+		sys.path_importer_cache.clear()
+		for name in list(sys.modules):
+			if name.split(".")[0] == PACKAGE:
+				del sys.modules[name]
+		shutil.rmtree(self.tmp, ignore_errors=True)
+
+	def testManifestKeepsLocalPackage(self):
+		self.boot["installManifestFinder"](self.share)
+		sys.path.extend([self.local, self.share])
+		package = __import__(PACKAGE)
+		self.assertEqual(os.path.dirname(package.__file__),
+			os.path.join(self.local, PACKAGE))
+		# The shared package's submodules aren't part of the local package
+		self.assertRaises(ImportError, __import__, PACKAGE + ".shared")
+
+	def testManifestFindsSharedSubmodule(self):
+		self.boot["installManifestFinder"](self.share)
+		sys.path.append(self.share)
+		module = __import__(PACKAGE + ".shared", fromlist=["x"])
+		self.assertEqual(module.__file__, os.path.join(self.share, PACKAGE, "shared.py"))
+
+	def testLoaderOfCachedModule(self):
+		self.boot["installImportHook"](self.share)
+		sys.path.append(self.share)
+		module = __import__(PACKAGE + ".shared", fromlist=["x"])
+		self.assertEqual(module.__loader__.__class__.__name__, "SharedLoader")
+		self.assertEqual(pkgutil.get_data(PACKAGE, "data.txt"), "hello\n")
+		self.assertEqual(inspect.getsource(module.f), "def f():\n\treturn 1\n")
+		self.assertTrue(module.__loader__.is_package(PACKAGE + ".shared") is False)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+#
+# testInstallPlan.py
+# mayaPyTools
+"""Tests of InstallPlan of the installer, run outside of Maya on stub maya
+modules.
+
+usage: python -m unittest discover -p "test*.py"
+"""
+
+import unittest
+import tempfile
+import shutil
+import errno
+import sys
+import os
+
+import mayaStubs
+from testPrefetch import writeFile
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+INSTALLER_DIR = os.path.dirname(TEST_DIR)
+
+def readFile(path):
+	f = open(path, "r")
+	try:
+		return f.read()
+	finally:
+		f.close()
+
+
+class InstallPlanTest(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp(prefix="foundationTest")
+		mayaStubs.installMayaStubs(self.tmp + os.sep, self.tmp + os.sep)
+		if INSTALLER_DIR not in sys.path:
+			sys.path.insert(0, INSTALLER_DIR)
+		import foundation_installer
+		self.installer = foundation_installer
+		self.path = os.path.join(self.tmp, "userSetup.py")
+		writeFile(self.path, "old\n")
+		self.link = getattr(os, "link", None)
+		self.replaceFile = foundation_installer.replaceFile
+
+	def tearDown(self):
+		if self.link is not None:
+			os.link = self.link
+		self.installer.replaceFile = self.replaceFile
+		shutil.rmtree(self.tmp, ignore_errors=True)
+
+	def testWithoutHardlinks(self):
+		def link(src, dst):
+			raise OSError(errno.EPERM, "Operation not permitted")
+		os.link = link
+		plan = self.installer.InstallPlan()
+		plan.add(self.path, "overwrite", "new\n")
+		plan.apply()
+		self.assertEqual(readFile(self.path), "new\n")
+		self.assertEqual(os.listdir(self.tmp), ["userSetup.py"])
+
+	def testRollbackOfFailedReplace(self):
+		replaceFile = self.replaceFile
+		def failingReplace(src, dst):
+			if src.endswith(".tmp"):
+				# As on Windows, where dst is removed before src is renamed
+				os.remove(dst)
+				raise OSError(errno.EACCES, "Permission denied")
+			replaceFile(src, dst)
+		self.installer.replaceFile = failingReplace
+		plan = self.installer.InstallPlan()
+		plan.add(self.path, "overwrite", "new\n")
+		self.assertRaises(OSError, plan.apply)
+		self.assertEqual(readFile(self.path), "old\n")
+		self.assertEqual(os.listdir(self.tmp), ["userSetup.py"])
+
+
+class DefaultPrefDirTest(unittest.TestCase):
+	def setUp(self):
+		# The installer finds Maya when it is first imported
+		mayaStubs.installMayaStubs(os.sep, os.sep)
+		if INSTALLER_DIR not in sys.path:
+			sys.path.insert(0, INSTALLER_DIR)
+		import foundation_installer
+		self.getDefaultPrefDir = foundation_installer.getDefaultPrefDir
+
+	def testLayouts(self):
+		windows = os.path.join("home", "Documents", "maya", "2012", "prefs")
+		self.assertEqual(self.getDefaultPrefDir(os.path.join(windows, "scripts", "")),
+			os.path.join(windows, ""))
+		linux = os.path.join("home", "maya", "2012")
+		self.assertEqual(self.getDefaultPrefDir(os.path.join(linux, "scripts", "")),
+			os.path.join(linux, "prefs", ""))
+
+	def testUnknownLayout(self):
+		self.assertEqual(self.getDefaultPrefDir(os.path.join("home", "tools", "")), None)
+
+
+if __name__ == "__main__":
+	unittest.main()
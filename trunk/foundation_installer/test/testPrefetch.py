@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+#
+# testPrefetch.py
+# mayaPyTools
+"""Tests of the Prefetcher of foundationBoot.py, run outside of Maya on stub
+maya modules.
+
+usage: python -m unittest discover -p "test*.py"
+"""
+
+import threading
+import unittest
+import tempfile
+import shutil
+import time
+import sys
+import os
+
+import mayaStubs
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+INSTALLER_DIR = os.path.dirname(TEST_DIR)
+
+def getBootNamespace(tmp):
+	"""Return namespace of foundationBoot.py, installed to tmp, up to and
+	including prefetching"""
+	userScriptDir = os.path.join(tmp, "scripts") + os.sep
+	userPrefDir = os.path.join(tmp, "prefs") + os.sep
+	os.makedirs(userScriptDir)
+	os.makedirs(userPrefDir)
+	mayaStubs.installMayaStubs(userScriptDir, userPrefDir)
+	if INSTALLER_DIR not in sys.path:
+		sys.path.insert(0, INSTALLER_DIR)
+	import foundation_installer
+	model = foundation_installer.Model()
+	model.setSharedFolderPath(os.path.join(tmp, "share") + os.sep)
+	namespace = model.getBootNamespace()
+	source = model._getBootProfileContent() + "\n\n" + model._getBootPrefetchContent()
+	exec compile(source, "foundationBoot.py", "exec") in namespace
+	return namespace
+
+def writeFile(path, content):
+	"""Write content to a new file at path, creating its folder"""
+	if not os.path.isdir(os.path.dirname(path)):
+		os.makedirs(os.path.dirname(path))
+	f = open(path, "w")
+	try:
+		f.write(content)
+	finally:
+		f.close()
+
+
+class PrefetcherTest(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp(prefix="foundationTest")
+		self.boot = getBootNamespace(self.tmp)
+		self.filename = os.path.join(self.tmp, "module.py")
+		writeFile(self.filename, "X = 1\n")
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp, ignore_errors=True)
+
+	def testTakeTwice(self):
+		prefetcher = self.boot["Prefetcher"]([self.filename], 1, True)
+		while self.filename in prefetcher.queued:
+			time.sleep(0.01)
+		code, source, digest = prefetcher.take(self.filename)
+		self.assertEqual(source, "X = 1\n")
+		# A reload() takes the file again, which reads it itself
+		self.assertEqual(prefetcher.take(self.filename), None)
+
+	def testTakeQueuedTwice(self):
+		# Without threads the file is still queued when it is taken
+		prefetcher = self.boot["Prefetcher"]([self.filename], 0, True)
+		self.assertEqual(prefetcher.take(self.filename), None)
+		self.assertEqual(prefetcher.take(self.filename), None)
+
+	def testTakeUnknown(self):
+		prefetcher = self.boot["Prefetcher"]([self.filename], 1, False)
+		self.assertEqual(prefetcher.take(self.filename + "c"), None)
+
+	def testWarmupIsNotKept(self):
+		prefetcher = self.boot["Prefetcher"]([], 1, False, [self.filename])
+		prefetcher.events[self.filename].wait()
+		self.assertEqual(prefetcher.results, {})
+		self.assertEqual(prefetcher.take(self.filename), None)
+
+	def testFinishDropsResults(self):
+		prefetcher = self.boot["Prefetcher"]([self.filename], 1, True)
+		prefetcher.events[self.filename].wait()
+		prefetcher.finish()
+		self.assertEqual(prefetcher.take(self.filename), None)
+
+
+class WriteFileAtomicTest(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp(prefix="foundationTest")
+		self.boot = getBootNamespace(self.tmp)
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp, ignore_errors=True)
+
+	def testThreadsWritingOneFile(self):
+		# As prefetch threads caching identical empty __init__.py files do
+		path = os.path.join(self.tmp, "cache", "object")
+		data = "x" * 65536
+		errors = []
+		def write():
+			try:
+				for i in range(50):
+					self.boot["writeFileAtomic"](path, data)
+			except Exception, e:
+				errors.append(e)
+		threads = [threading.Thread(target=write) for i in range(8)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertEqual(errors, [])
+		self.assertEqual(self.boot["readSource"](path), data)
+		self.assertEqual(os.listdir(os.path.dirname(path)), ["object"])
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+#
+# testTelemetry.py
+# mayaPyTools
+"""Tests of foundationTelemetry.py.
+
+usage: python -m unittest discover -p "test*.py"
+"""
+
+import unittest
+import tempfile
+import shutil
+import json
+import sys
+import os
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+BIN_DIR = os.path.join(os.path.dirname(os.path.dirname(TEST_DIR)), "bin")
+if BIN_DIR not in sys.path:
+	sys.path.insert(0, BIN_DIR)
+import foundationTelemetry
+
+
+class PercentileTest(unittest.TestCase):
+	def testNearestRank(self):
+		values = range(1, 101)
+		self.assertEqual(foundationTelemetry.percentile(values, 50), 50)
+		self.assertEqual(foundationTelemetry.percentile(values, 95), 95)
+		self.assertEqual(foundationTelemetry.percentile(values, 99), 99)
+		self.assertEqual(foundationTelemetry.percentile(values, 7), 7)
+
+	def testFewValues(self):
+		self.assertEqual(foundationTelemetry.percentile([1, 2], 50), 1)
+		self.assertEqual(foundationTelemetry.percentile([1, 2], 95), 2)
+		self.assertEqual(foundationTelemetry.percentile([3], 50), 3)
+		self.assertEqual(foundationTelemetry.percentile([1, 2, 3, 4, 5], 0), 1)
+
+
+class ReadRecordsTest(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp(prefix="foundationTest")
+		cache = os.path.join(self.tmp, "foundationCache")
+		os.makedirs(cache)
+		self.writeLines(os.path.join(cache, "telemetry.jsonl"), [
+			{"host": "a", "time": 1, "total": 1.5},
+			{"host": "a", "time": 2, "total": 2.5},
+		])
+		self.writeLines(os.path.join(cache, "telemetry.1.jsonl"), [
+			{"host": "a", "time": 0, "total": 3.5},
+		])
+		self.writeLines(os.path.join(cache, "install.jsonl"), [
+			{"time": 3, "kind": "info", "text": "Installed"},
+		])
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp, ignore_errors=True)
+
+	def writeLines(self, path, records):
+		f = open(path, "w")
+		try:
+			f.write("\n".join([json.dumps(r) for r in records]) + "\n")
+		finally:
+			f.close()
+
+	def testFolderSkipsInstallJournal(self):
+		records = foundationTelemetry.readRecords([self.tmp])
+		self.assertEqual(sorted([r["total"] for r in records]), [1.5, 2.5, 3.5])
+
+	def testFileSkipsOtherRecords(self):
+		path = os.path.join(self.tmp, "foundationCache", "install.jsonl")
+		self.assertEqual(foundationTelemetry.readRecords([path]), [])
+
+
+if __name__ == "__main__":
+	unittest.main()